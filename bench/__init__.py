@@ -0,0 +1 @@
+# أدوات القياس والتجربة المحلية (لا تُستخدم أثناء تشغيل البوت)
@@ -0,0 +1,52 @@
+import argparse
+import random
+import time
+
+from sampler import DifficultyIndex, QuestionSampler, expected_correct
+
+# كلفة الاختيار التكيفي مع حجم البنك: بناء الفهرس، اختيار سؤال، وتحديثه بعد كل إجابة
+def bench(size, students, picks):
+    rng = random.Random(1)
+    start = time.perf_counter()
+    index = DifficultyIndex(rng=rng)
+    for question_id in range(size):
+        attempts = rng.randrange(50)
+        index.add(question_id, attempts, rng.randint(0, attempts))
+    build_time = time.perf_counter() - start
+
+    abilities = [rng.gauss(0, 1) for _ in range(students)]
+    choose_time = record_time = 0.0
+    hits = 0
+    for i in range(picks):
+        user_id = i % students
+        start = time.perf_counter()
+        question_id = index.choose(user_id)
+        choose_time += time.perf_counter() - start
+        correct = rng.random() < expected_correct(abilities[user_id], index.difficulty(question_id))
+        hits += correct
+        start = time.perf_counter()
+        index.record(user_id, question_id, correct)
+        record_time += time.perf_counter() - start
+
+    sampler = QuestionSampler(rng=rng)
+    for question_id in range(size):
+        sampler.add({"id": question_id, "type": "multiple_choice"})
+    start = time.perf_counter()
+    for _ in range(picks):
+        sampler.sample(1)
+    random_time = time.perf_counter() - start
+    return build_time, choose_time / picks, record_time / picks, random_time / picks, hits / picks
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس فهرس الصعوبة للاختيار التكيفي")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--picks", type=int, default=50000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        build_time, choose_time, record_time, random_time, hit_rate = bench(size, args.students, args.picks)
+        print(f"questions={size}: build={build_time * 1000:.0f}ms choose={choose_time * 1e6:.1f}us "
+              f"record={record_time * 1e6:.1f}us random_sample={random_time * 1e6:.1f}us correct_rate={hit_rate:.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientError, ClientSession, web
+
+import cluster
+import config
+from bench.fake_bot_api import FakeBotApi
+from bench.harness import callback_update, seed_database
+
+MESSAGE_ID = 50
+TEST_ANSWERS = 5
+
+async def wait_ready(session, urls, timeout=60):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        break
+            except ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"العامل لم يبدأ: {url}")
+            await asyncio.sleep(0.2)
+
+# اختبار كامل لكل طالب: بدء الاختبار ثم الإجابة عن الأسئلة بالتتابع، والطلاب معاً
+async def drive(session, url, students):
+    update_ids = iter(range(1, students * (TEST_ANSWERS + 1) + 1))
+
+    async def student(user_id):
+        for data in ["start_test"] + [f"answer_{i % 4}" for i in range(TEST_ANSWERS)]:
+            async with session.post(url, json=callback_update(next(update_ids), user_id, data, MESSAGE_ID)) as response:
+                response.raise_for_status()
+
+    await asyncio.gather(*(student(user_id) for user_id in range(1000, 1000 + students)))
+
+# مجموع انتظار محدد المعدل (بالثواني) من مقاييس العمال
+async def throttle_wait(session, urls):
+    total = 0.0
+    for url in urls:
+        async with session.get(url) as response:
+            for line in (await response.text()).splitlines():
+                if line.startswith("quiz_bot_telegram_throttle_seconds_sum"):
+                    total += float(line.rsplit(" ", 1)[1])
+    return total
+
+# rate_limit: حد Bot API الكلي للعمال معاً؛ 0 يعطّل المحدد فيقيس القياس توزيع العمل وحده
+async def run(workers, students, questions, rate_limit=0):
+    api = FakeBotApi()
+    base_url = await api.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed_database(db_path, questions)
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN="1:fake", TELEGRAM_ADMIN_ID="1", TELEGRAM_API_BASE_URL=base_url,
+                   DATABASE_FILE=db_path, TELEGRAM_RATE_LIMIT=str(rate_limit), PYTHONUNBUFFERED="1")
+        port = config.WORKER_BASE_PORT
+        processes = cluster.start_workers(workers, port, env, cwd=tmp)
+        path = "/telegram"
+        runner = web.AppRunner(cluster.create_front_app(
+            [f"http://127.0.0.1:{port + i}{path}" for i in range(workers)], path, ""))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        front_url = f"http://127.0.0.1:{runner.addresses[0][1]}{path}"
+        try:
+            async with ClientSession() as session:
+                await wait_ready(session, [f"http://127.0.0.1:{port + i}/health" for i in range(workers)])
+                expected = students * (TEST_ANSWERS + 1)
+                start = time.perf_counter()
+                await drive(session, front_url, students)
+                # الرد على webhook يعني أن التحديث وُضع في الطابور؛ ننتظر حتى تصل كل التعديلات
+                while api.count("editMessageText") < expected:
+                    if time.perf_counter() - start > 300:
+                        break
+                    await asyncio.sleep(0.01)
+                elapsed = time.perf_counter() - start
+                throttled = await throttle_wait(session, [f"http://127.0.0.1:{port + i}/metrics"
+                                                          for i in range(workers)])
+        finally:
+            await runner.cleanup()
+            cluster.stop_workers(processes)
+            await api.stop()
+    edits = api.count("editMessageText")
+    line = (f"workers={workers} students={students} updates={expected} edits={edits} "
+            f"elapsed={elapsed:.2f}s throughput={expected / elapsed:.0f} updates/s")
+    if rate_limit:
+        line += f" throttle_wait={throttled:.2f}s ({throttled / expected * 1000:.1f}ms/update)"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="إنتاجية البوت مع عدد العمال على خادم Bot API وهمي")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="تفعيل محدد المعدل بهذا الحد الكلي وعرض الانتظار فيه (الافتراضي 0: معطّل)")
+    args = parser.parse_args()
+    print(f"CPUs: {os.cpu_count()}", file=sys.stderr)
+    for workers in args.workers:
+        asyncio.run(run(workers, args.students, args.questions, args.rate_limit))
+
+if __name__ == '__main__':
+    main()
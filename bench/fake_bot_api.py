@@ -0,0 +1,89 @@
+import json
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+# خادم Bot API وهمي للتجربة المحلية: يسجل الطلبات ويحاكي حد الإرسال (429) لكل محادثة
+class FakeBotApi:
+    def __init__(self, chat_limit=None, retry_after=1):
+        self.chat_limit = chat_limit
+        self.retry_after = retry_after
+        self.calls = []
+        self.flood_errors = 0
+        self._recent = defaultdict(deque)
+        self._message_id = 0
+
+    def _parse(self, form):
+        data = {}
+        for key, value in form.items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            data[key] = value
+        return data
+
+    def _flooded(self, chat_id):
+        if self.chat_limit is None or chat_id is None:
+            return False
+        now = time.monotonic()
+        recent = self._recent[chat_id]
+        while recent and now - recent[0] > 1:
+            recent.popleft()
+        if len(recent) >= self.chat_limit:
+            return True
+        recent.append(now)
+        return False
+
+    def _message(self, data):
+        message_id = data.get("message_id")
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": {"id": data.get("chat_id", 0), "type": "private"}}
+        if "text" in data:
+            message["text"] = data["text"]
+        return message
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = self._parse(await request.post())
+        chat_id = data.get("chat_id")
+        if method not in ("getMe", "answerCallbackQuery") and self._flooded(chat_id):
+            self.flood_errors += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": f"Too Many Requests: retry after {self.retry_after}",
+                                      "parameters": {"retry_after": self.retry_after}}, status=429)
+        self.calls.append((time.monotonic(), method, data))
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        elif method == "getUpdates":
+            result = []
+        elif method.startswith("send") or method.startswith("edit"):
+            result = self._message(data)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    # تشغيل الخادم على منفذ محلي وإرجاع base_url المناسب لـ ApplicationBuilder.base_url
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/bot"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def count(self, method):
+        return sum(1 for _, m, _ in self.calls if m == method)
@@ -0,0 +1,80 @@
+import json
+import math
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+from database import Database
+
+# طبقة HTTP بديلة لـ Bot: ترد على كل طلب فوراً من الذاكرة دون شبكة، وتعدّ الطلبات حسب النوع
+class StubRequest(BaseRequest):
+    def __init__(self):
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    def _message(self, data):
+        message_id = data.get("message_id")
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": {"id": data.get("chat_id", 0), "type": "private"}}
+        if "text" in data:
+            message["text"] = data["text"]
+        return message
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        data = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        elif endpoint.startswith("send") or endpoint.startswith("edit"):
+            result = self._message(data)
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"طالب {user_id}"}
+
+def message_update(update_id, user_id, text):
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text, "entities": entities,
+        "from": user(user_id), "chat": {"id": user_id, "type": "private"},
+    }}
+
+def callback_update(update_id, user_id, data, message_id):
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": str(user_id), "data": data, "from": user(user_id),
+        "message": {"message_id": message_id, "date": int(time.time()), "text": "...",
+                    "chat": {"id": user_id, "type": "private"}},
+    }}
+
+# قاعدة بيانات تجريبية ببنك من count سؤال اختيار من متعدد
+def seed_database(path, count):
+    db = Database(path)
+    db.init()
+    db.add_questions([{"type": "multiple_choice", "question": f"سؤال {i}", "options": ["أ", "ب", "ج", "د"],
+                       "correct_option": i % 4} for i in range(count)])
+    db.close()
+
+# المئين بطريقة الرتبة الأقرب
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
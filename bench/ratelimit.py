@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import time
+
+from telegram.ext import ExtBot
+
+from bench.fake_bot_api import FakeBotApi
+from ratelimit import TelegramRateLimiter
+
+# محاكاة فصل كامل يضغط "بدء الاختبار" معاً: تعديلات متتالية لرسائل عدة محادثات
+async def run(students, edits, chat_limit):
+    api = FakeBotApi(chat_limit=chat_limit)
+    base_url = await api.start()
+    limiter = TelegramRateLimiter()
+    bot = ExtBot("1:fake", base_url=base_url, rate_limiter=limiter)
+    await bot.initialize()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            bot.edit_message_text(f"edit {i}", chat_id=chat_id, message_id=1)
+            for chat_id in range(1, students + 1) for i in range(edits)
+        ))
+    finally:
+        elapsed = time.perf_counter() - start
+        await bot.shutdown()
+        await api.stop()
+    print(f"students={students} edits/student={edits} elapsed={elapsed:.2f}s")
+    print(f"sent={api.count('editMessageText')} dropped={limiter.dropped_edits} "
+          f"429s={api.flood_errors} retries={limiter.retries}")
+
+def main():
+    parser = argparse.ArgumentParser(description="تجربة محدد المعدل على خادم Bot API وهمي")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=5)
+    parser.add_argument("--chat-limit", type=int, default=3, help="عدد الطلبات المسموح بها لكل محادثة في الثانية قبل 429")
+    args = parser.parse_args()
+    asyncio.run(run(args.students, args.edits, args.chat_limit))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from telegram import Update
+
+from bench.harness import StubRequest, callback_update, message_update, percentile, seed_database
+from database import DEFAULT_CLASS_ID
+from main import TEST_SIZE, build_application
+
+MESSAGE_ID = 1
+
+# جلسة طالب كاملة: /start ثم بدء الاختبار ثم الإجابات (آخرها ينهي الاختبار) ثم عرض النتائج
+def session_script():
+    answers = [("answer", f"answer_{i % 4}") for i in range(TEST_SIZE)]
+    answers[-1] = ("finish_test", answers[-1][1])
+    return [("start", "/start"), ("start_test", "start_test"), *answers, ("my_results", "my_results")]
+
+# ذروة ذاكرة العملية كلها منذ بدئها، لذلك يعمل كل إعداد في عملية جديدة (run_isolated)
+def peak_rss_mb():
+    # ru_maxrss بالكيلوبايت على لينكس وبالبايت على macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {"count": len(samples),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3) if samples else 0.0}
+
+async def run(bank_size, students, concurrency):
+    request = StubRequest()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed_database(db_path, bank_size)
+        # post_init يرحّل ملفات JSON القديمة من المجلد الحالي، فنعمل داخل المجلد المؤقت
+        os.chdir(tmp)
+        application = build_application("1:stub", "1", database_file=db_path, base_url="", request=request,
+                                        rate_limit=False)
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        # تحميل بنك الأسئلة إلى الذاكرة (يحدث عند أول اختبار في الفصل)
+        start = time.perf_counter()
+        await application.bot_data["tenancy"].store(DEFAULT_CLASS_ID)
+        store_load = time.perf_counter() - start
+
+        latencies = defaultdict(list)
+        script = session_script()
+        update_ids = iter(range(1, students * len(script) + 1))
+        limit = asyncio.Semaphore(concurrency)
+
+        async def student(user_id):
+            async with limit:
+                for step, data in script:
+                    update_id = next(update_ids)
+                    if data.startswith("/"):
+                        payload = message_update(update_id, user_id, data)
+                    else:
+                        payload = callback_update(update_id, user_id, data, MESSAGE_ID)
+                    update = Update.de_json(payload, application.bot)
+                    began = time.perf_counter()
+                    await application.process_update(update)
+                    latencies[step].append(time.perf_counter() - began)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(student(user_id) for user_id in range(1000, 1000 + students)))
+            elapsed = time.perf_counter() - start
+        finally:
+            await application.stop()
+            await application.shutdown()
+            await application.post_shutdown(application)
+            os.chdir(cwd)
+
+    updates = sum(len(samples) for samples in latencies.values())
+    return {
+        "bank_size": bank_size,
+        "students": students,
+        "concurrency": concurrency,
+        "updates": updates,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_updates_s": round(updates / elapsed, 1),
+        "store_load_ms": round(store_load * 1000, 3),
+        "latency": {"all": summarize([s for samples in latencies.values() for s in samples]),
+                    **{step: summarize(samples) for step, samples in latencies.items()}},
+        "peak_rss_mb": peak_rss_mb(),
+        "bot_calls": dict(request.calls),
+    }
+
+def run_sync(bank_size, students, concurrency):
+    return asyncio.run(run(bank_size, students, concurrency))
+
+# تشغيل إعداد واحد في عملية جديدة: peak_rss_mb لهذا الإعداد وحده لا ذروة ما سبقه
+def run_isolated(bank_size, students, concurrency):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_sync, bank_size, students, concurrency).result()
+
+# مقارنة تشغيلين: نسبة p95 والإنتاجية لكل إعداد مشترك
+def compare(baseline, current):
+    old = {(r["bank_size"], r["students"], r["concurrency"]): r for r in baseline["runs"]}
+    for run_result in current["runs"]:
+        key = (run_result["bank_size"], run_result["students"], run_result["concurrency"])
+        if key not in old:
+            continue
+        before = old[key]
+        p95_before = before["latency"]["all"]["p95_ms"] or 1e-9
+        print(f"bank={key[0]} students={key[1]} concurrency={key[2]}: "
+              f"p95 x{run_result['latency']['all']['p95_ms'] / p95_before:.2f}, "
+              f"throughput x{run_result['throughput_updates_s'] / before['throughput_updates_s']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="إعادة تشغيل جلسات طلاب على المعالجات مباشرة مع Bot وهمي")
+    parser.add_argument("--bank-sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50])
+    parser.add_argument("--output", default="bench-sessions.json", help="ملف JSON للنتائج")
+    parser.add_argument("--compare", help="ملف JSON من تشغيل سابق للمقارنة")
+    args = parser.parse_args()
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "platform": platform.platform(), "cpus": os.cpu_count(), "runs": []}
+    for bank_size in args.bank_sizes:
+        for concurrency in args.concurrency:
+            result = run_isolated(bank_size, args.students, concurrency)
+            results["runs"].append(result)
+            overall = result["latency"]["all"]
+            print(f"bank={bank_size} students={args.students} concurrency={concurrency} "
+                  f"throughput={result['throughput_updates_s']} updates/s p50={overall['p50_ms']}ms "
+                  f"p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms rss={result['peak_rss_mb']}MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"النتائج في {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == '__main__':
+    main()
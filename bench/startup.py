@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.harness import seed_database
+from database import DEFAULT_CLASS_ID, Database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# يعمل في عملية جديدة: زمن استيراد main ثم التهيئة ثم الرد على أول تحديث
+CHILD = '''
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+from telegram import Update
+from bench.harness import StubRequest, callback_update
+imported = time.perf_counter()
+
+async def ready():
+    application = main.build_application("1:stub", "1", database_file=sys.argv[1], base_url="", request=StubRequest())
+    built = time.perf_counter()
+    await application.initialize()
+    await application.post_init(application)
+    initialized = time.perf_counter()
+    # أول اختبار يحمّل بنك أسئلة الفصل
+    await application.process_update(Update.de_json(callback_update(1, 999, "start_test", 1), application.bot))
+    done = time.perf_counter()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return built, initialized, done
+
+built, initialized, done = asyncio.run(ready())
+print(json.dumps({"import_s": imported - start, "build_s": built - imported, "init_s": initialized - built,
+                  "first_update_s": done - initialized, "total_s": done - start}))
+'''
+
+# قاعدة بيانات بحجم واقعي: أسئلة ونتائج وطلاب مسجلون وجلسات محفوظة
+def seed(path, questions, students):
+    seed_database(path, questions)
+    db = Database(path)
+    db.init()
+    for user_id in range(1000, 1000 + students):
+        db.set_membership(str(user_id), f"طالب {user_id}", DEFAULT_CLASS_ID, "student")
+    db.add_results([{"user_id": str(user_id), "name": "طالب", "date": "2024-01-01 10:00", "score": 3, "total": 5}
+                    for user_id in range(1000, 1000 + students)])
+    db.save_sessions({user_id: json.dumps({"test_question_ids": [1, 2, 3, 4, 5], "current_question": 1, "score": 1,
+                                           "answers": [0], "last_activity": time.time()})
+                      for user_id in range(1000, 1000 + students // 10)}, time.time())
+    db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="زمن التشغيل البارد: الاستيراد والتهيئة حتى أول تحديث")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--target", type=float, default=1.0, help="الحد المقبول لوسيط الزمن الكلي بالثواني")
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, args.questions, args.students)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", CHILD, db_path], cwd=tmp, env=env, check=True,
+                                    capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {key: round(statistics.median(run[key] for run in runs) * 1000, 1) for key in runs[0]}
+    print(" ".join(f"{key[:-2]}={value}ms" for key, value in summary.items()))
+    target_ms = args.target * 1000
+    if summary["total_s"] > target_ms:
+        print(f"❌ أبطأ من الهدف ({target_ms:.0f}ms)")
+        return 1
+    print(f"✅ ضمن الهدف ({target_ms:.0f}ms)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import random
+import time
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from timers import TimerWheel
+
+# كلفة المؤقتات مع تزايد عدد الجلسات المتزامنة: عجلة مؤقتات واحدة مقابل مهمة APScheduler لكل سؤال
+def bench_wheel(sessions, questions, limit):
+    wheel = TimerWheel(tick=1.0)
+    now = 0.0
+    start = time.perf_counter()
+    for user_id in range(sessions):
+        wheel.schedule((user_id, "question"), now + random.uniform(1, limit), 0)
+    schedule_time = time.perf_counter() - start
+
+    # كل ثانية: نصف الطلاب يجيبون (إعادة جدولة)، ثم نبضة واحدة تعالج المستحق
+    tick_times = []
+    fired = 0
+    for second in range(1, questions * limit + 1):
+        now = float(second)
+        for user_id in random.sample(range(sessions), sessions // 2):
+            wheel.schedule((user_id, "question"), now + limit, second)
+        start = time.perf_counter()
+        fired += len(wheel.advance(now))
+        tick_times.append(time.perf_counter() - start)
+    return schedule_time / sessions, sum(tick_times) / len(tick_times), max(tick_times), fired
+
+async def bench_apscheduler(sessions, limit):
+    scheduler = AsyncIOScheduler()
+    scheduler.start()
+    start = time.perf_counter()
+    jobs = [scheduler.add_job(lambda: None, "date", run_date=_in(limit)) for _ in range(sessions)]
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for job in jobs:
+        job.reschedule("date", run_date=_in(limit))
+    reschedule_time = time.perf_counter() - start
+    scheduler.shutdown(wait=False)
+    return add_time / sessions, reschedule_time / sessions
+
+def _in(seconds):
+    import datetime
+    return datetime.datetime.now() + datetime.timedelta(seconds=seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس كلفة مؤقتات الاختبارات")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=30, help="مهلة السؤال بالثواني")
+    parser.add_argument("--skip-apscheduler", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>9} | {'wheel schedule':>14} | {'wheel tick avg':>14} | {'wheel tick max':>14} | "
+          f"{'aps add_job':>12} | {'aps reschedule':>14}")
+    for sessions in args.sessions:
+        schedule, tick_avg, tick_max, _ = bench_wheel(sessions, args.questions, args.limit)
+        line = f"{sessions:>9} | {schedule * 1e6:>11.2f} µs | {tick_avg * 1e3:>11.3f} ms | {tick_max * 1e3:>11.3f} ms"
+        if not args.skip_apscheduler:
+            add, reschedule = asyncio.run(bench_apscheduler(sessions, args.limit))
+            line += f" | {add * 1e6:>9.2f} µs | {reschedule * 1e6:>11.2f} µs"
+        print(line)
+
+if __name__ == '__main__':
+    main()
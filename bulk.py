@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+from database import DEFAULT_CLASS_ID, Database
+from media import ImageResolver
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+CSV_FIELDS = ["type", "question", "options", "correct", "category", "photo_id", "image"]
+OPTION_SEPARATOR = "|"
+TRUE_VALUES = {"1", "true", "صح", "t", "yes"}
+FALSE_VALUES = {"0", "false", "خطأ", "f", "no"}
+
+# ملخص عملية الاستيراد: الأعداد وأول الأخطاء مع رقم السطر
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+    def summary(self):
+        lines = [
+            f"الأسطر: {self.rows}",
+            f"تم الاستيراد: {self.imported}",
+            f"مكرر: {self.duplicates}",
+            f"أخطاء: {self.error_count}",
+        ]
+        for line_no, message in self.errors:
+            lines.append(f"  السطر {line_no}: {message}")
+        if self.error_count > len(self.errors):
+            lines.append(f"  ... و{self.error_count - len(self.errors)} أخطاء أخرى")
+        return "\n".join(lines)
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"صيغة غير مدعومة: {extension} (المدعوم: csv, jsonl)")
+
+# قراءة الصفوف واحداً تلو الآخر مع رقم السطر
+def iter_rows(f, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, None
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"قيمة صح/خطأ غير صالحة: {value}")
+
+# قيمة حقل نصي بعد التحقق من نوعها (صفوف JSONL قد تحمل أرقاماً أو قوائم)
+def text_field(row, field):
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"الحقل {field} يجب أن يكون نصاً: {value!r}")
+    return value.strip()
+
+# التحقق من صف وتحويله إلى سؤال بالشكل المستخدم في قاعدة البيانات
+def validate_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("سطر JSON غير صالح")
+    q_type = text_field(row, "type")
+    text = text_field(row, "question")
+    if q_type not in ("multiple_choice", "true_false"):
+        raise ValueError(f"نوع سؤال غير معروف: {q_type!r}")
+    if not text:
+        raise ValueError("نص السؤال فارغ")
+    question = {"type": q_type, "question": text}
+    if q_type == "multiple_choice":
+        options = row.get("options") or []
+        if isinstance(options, str):
+            options = options.split(OPTION_SEPARATOR)
+        if not isinstance(options, list) or not all(isinstance(o, str) for o in options):
+            raise ValueError(f"الخيارات يجب أن تكون نصوصاً: {options!r}")
+        options = [o.strip() for o in options if o.strip()]
+        if len(options) < 2:
+            raise ValueError("يجب أن يحتوي السؤال على خيارين على الأقل")
+        correct = row.get("correct_option", row.get("correct"))
+        try:
+            # في CSV رقم الخيار يبدأ من 1، وفي JSONL يُقبل correct_option بدءاً من 0
+            correct = int(correct) if "correct_option" in row else int(correct) - 1
+        except (TypeError, ValueError):
+            raise ValueError(f"رقم الإجابة الصحيحة غير صالح: {correct!r}")
+        if not 0 <= correct < len(options):
+            raise ValueError(f"رقم الإجابة الصحيحة خارج النطاق: {correct + 1}")
+        question["options"] = options
+        question["correct_option"] = correct
+    else:
+        question["correct_answer"] = parse_bool(row.get("correct_answer", row.get("correct", "")))
+    for field in ("category", "photo_id", "image"):
+        value = text_field(row, field)
+        if value:
+            question[field] = value
+    return question
+
+def question_key(question):
+    raw = json.dumps([question["type"], " ".join(question["question"].split()).lower(),
+                      question.get("options", []), question.get("photo_id")], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).digest()
+
+# استيراد ملف كامل: التحقق، حذف المكرر، والإدخال على دفعات
+# resolve_image يحوّل مسار صورة محلية (عمود image) إلى file_id
+def import_questions(db, f, fmt, progress=None, on_batch=None, resolve_image=None, class_id=DEFAULT_CLASS_ID):
+    report = ImportReport()
+    seen = {question_key(q) for q in db.iter_questions(class_id)}
+    batch = []
+
+    def flush_batch():
+        saved = db.add_questions(batch)
+        report.imported += len(saved)
+        if on_batch:
+            on_batch(saved)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for line_no, row in iter_rows(f, fmt):
+        report.rows += 1
+        try:
+            question = validate_row(row)
+            image = question.pop("image", None)
+            if image:
+                if resolve_image is None:
+                    raise ValueError("لا يمكن رفع الصور من هنا، استخدم photo_id أو سطر الأوامر")
+                question["photo_id"] = resolve_image(image)
+        except (ValueError, OSError, TelegramError) as exc:
+            report.add_error(line_no, str(exc))
+            continue
+        key = question_key(question)
+        if key in seen:
+            report.duplicates += 1
+            continue
+        seen.add(key)
+        question["class_id"] = class_id
+        batch.append(question)
+        if len(batch) >= BATCH_SIZE:
+            flush_batch()
+    if batch:
+        flush_batch()
+    elif progress:
+        progress(report)
+    return report
+
+def question_to_csv_row(question):
+    row = {"type": question["type"], "question": question["question"],
+           "category": question.get("category", ""), "photo_id": question.get("photo_id", ""), "image": ""}
+    if question["type"] == "multiple_choice":
+        row["options"] = OPTION_SEPARATOR.join(question.get("options", []))
+        row["correct"] = question.get("correct_option", 0) + 1
+    else:
+        row["options"] = ""
+        row["correct"] = "true" if question.get("correct_answer") else "false"
+    return row
+
+# تصدير الأسئلة على دفعات دون تحميل البنك كله في الذاكرة
+def export_questions(db, f, fmt, progress=None, class_id=DEFAULT_CLASS_ID):
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+    count = 0
+    for question in db.iter_questions(class_id):
+        if writer:
+            writer.writerow(question_to_csv_row(question))
+        else:
+            question = {k: v for k, v in question.items() if k != "id"}
+            f.write(json.dumps(question, ensure_ascii=False) + "\n")
+        count += 1
+        if progress and count % BATCH_SIZE == 0:
+            progress(count)
+    return count
+
+# رافع صور لسطر الأوامر: يستخدم توكن البوت وحلقة أحداث خاصة به
+class CliImageResolver(ImageResolver):
+    def __init__(self, db, chat_id, base_dir):
+        loop = asyncio.new_event_loop()
+        bot = Bot(os.environ["TELEGRAM_BOT_TOKEN"])
+        loop.run_until_complete(bot.initialize())
+        super().__init__(db, bot, chat_id, loop)
+        self.base_dir = base_dir
+
+    def __call__(self, path):
+        return super().__call__(os.path.join(self.base_dir, path))
+
+    def close(self):
+        self.loop.run_until_complete(self.bot.shutdown())
+        self.loop.close()
+
+def make_image_resolver(db, chat_id, base_dir):
+    if not chat_id:
+        return None
+    return CliImageResolver(db, chat_id, base_dir)
+
+def open_text(path, mode):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer if "r" in mode else sys.stdout.buffer, encoding="utf-8")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="استيراد وتصدير بنك الأسئلة (CSV أو JSONL)")
+    parser.add_argument("--db", default=os.getenv("DATABASE_FILE", "questions.db"))
+    parser.add_argument("--class-id", type=int, default=DEFAULT_CLASS_ID, help="رقم الفصل (الافتراضي 1)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_parser = sub.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"])
+    import_parser.add_argument("--media-chat", help="محادثة تُرفع إليها الصور مرة واحدة للحصول على file_id")
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"])
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    db = Database(args.db)
+    db.init()
+    try:
+        if args.command == "import":
+            def progress(report):
+                print(f"... {report.rows} سطر، {report.imported} سؤال", file=sys.stderr)
+            resolver = make_image_resolver(db, args.media_chat, os.path.dirname(os.path.abspath(args.path)))
+            try:
+                with open_text(args.path, "r") as f:
+                    report = import_questions(db, f, fmt, progress=progress, resolve_image=resolver,
+                                              class_id=args.class_id)
+            finally:
+                if resolver:
+                    resolver.close()
+            print(report.summary(), file=sys.stderr)
+            if resolver:
+                print(f"صور مرفوعة: {resolver.uploaded}، صور من الذاكرة: {resolver.reused}", file=sys.stderr)
+            return 1 if report.error_count else 0
+        with open_text(args.path, "w") as f:
+            count = export_questions(db, f, fmt, progress=lambda n: print(f"... {n} سؤال", file=sys.stderr),
+                                     class_id=args.class_id)
+        print(f"تم تصدير {count} سؤال", file=sys.stderr)
+        return 0
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
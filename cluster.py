@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import hmac
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector, web
+from telegram import Bot, Update
+
+import config
+from database import Database
+from live import live_answer_owner
+from webhook import SECRET_HEADER, is_loopback
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# أنواع التحديثات التي تحمل المستخدم في الحقل from (أو user)
+USER_UPDATE_FIELDS = ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+                      "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member",
+                      "chat_join_request")
+
+def shard_of(user_id, workers):
+    return user_id % workers
+
+# المستخدم الذي يحدد العامل المسؤول عن التحديث (None للتحديثات بلا مستخدم)
+def shard_key(data):
+    for field in USER_UPDATE_FIELDS:
+        payload = data.get(field)
+        if not isinstance(payload, dict):
+            continue
+        if field == "callback_query":
+            owner = live_answer_owner(str(payload.get("data") or ""))
+            if owner is not None:
+                return owner
+        user = payload.get("from") or payload.get("user")
+        user_id = user.get("id") if isinstance(user, dict) else None
+        return user_id if isinstance(user_id, int) else None
+    return None
+
+# الواجهة: تستقبل webhook وتوزّع كل تحديث على عامل حسب المستخدم، فتبقى جلسته عند العامل نفسه
+def create_front_app(worker_urls, path, secret_token):
+    async def on_startup(app):
+        app["session"] = ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=60))
+
+    async def on_cleanup(app):
+        await app["session"].close()
+
+    async def handle_update(request):
+        if secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret_token):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        key = shard_key(data)
+        worker = shard_of(key, len(worker_urls)) if key is not None else 0
+        headers = {SECRET_HEADER: secret_token} if secret_token else {}
+        try:
+            # ننتظر رد العامل (بعد وضع التحديث في طابوره) فيبقى ترتيب تحديثات المستخدم محفوظاً
+            async with request.app["session"].post(worker_urls[worker], json=data, headers=headers) as response:
+                return web.Response(status=response.status)
+        except ClientError as exc:
+            logger.warning("تعذر الوصول إلى العامل %d: %s", worker, exc)
+            return web.Response(status=502)
+
+    async def health(request):
+        return web.json_response({"status": "ok", "workers": len(worker_urls)})
+
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/health", health)
+    return app
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# تشغيل العمال: كل عامل هو main.py بوضع webhook على منفذ محلي ولا يسجّل webhook بنفسه
+# ولا يهيئ قاعدة البيانات (يجب تهيئتها قبل الاستدعاء، انظر main.prepare_storage)
+# (cwd: مجلد الملفات المحلية مثل ملفات JSON القديمة، الافتراضي مجلد التشغيل الحالي)
+def start_workers(count, base_port, env=None, cwd=None):
+    workers = []
+    for index in range(count):
+        worker_env = dict(os.environ if env is None else env)
+        worker_env.update({
+            "BOT_MODE": "webhook",
+            "WEBHOOK_URL": "",
+            "WEBHOOK_HOST": "127.0.0.1",
+            "PORT": str(base_port + index),
+            "WORKER_INDEX": str(index),
+            "WORKER_COUNT": str(count),
+        })
+        workers.append(subprocess.Popen([sys.executable, MAIN_SCRIPT], env=worker_env, cwd=cwd))
+    return workers
+
+def stop_workers(workers):
+    for worker in workers:
+        if worker.poll() is None:
+            worker.send_signal(signal.SIGTERM)
+    for worker in workers:
+        try:
+            worker.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+async def run_front(count, host, port, path, url="", secret_token=""):
+    worker_urls = [f"http://127.0.0.1:{config.WORKER_BASE_PORT + i}{path}" for i in range(count)]
+    if url:
+        kwargs = {"base_url": config.TELEGRAM_API_BASE_URL} if config.TELEGRAM_API_BASE_URL else {}
+        async with Bot(config.TELEGRAM_BOT_TOKEN, **kwargs) as bot:
+            await bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret_token or None,
+                                  allowed_updates=Update.ALL_TYPES)
+
+    runner = web.AppRunner(create_front_app(worker_urls, path, secret_token))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("الواجهة تستمع على %s:%d%s وتوزع على %d عامل", host, port, path, count)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="تشغيل البوت بعدة عمال خلف واجهة webhook واحدة")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "2")))
+    args = parser.parse_args(argv)
+
+    if not config.TELEGRAM_BOT_TOKEN or not os.getenv("TELEGRAM_ADMIN_ID"):
+        print("⚠️  يجب تعيين TELEGRAM_BOT_TOKEN وTELEGRAM_ADMIN_ID قبل تشغيل العمال")
+        return 1
+    # الواجهة تمرر التحديثات للعمال دون تحقق آخر: بلا رمز سري تقبل تحديثات مزيفة من أي أحد يصل إليها
+    if not config.WEBHOOK_SECRET and (config.WEBHOOK_URL or not is_loopback(config.WEBHOOK_HOST)):
+        print(f"⚠️  يجب تعيين WEBHOOK_SECRET ليتحقق العمال من الطلبات (الواجهة تستمع على {config.WEBHOOK_HOST})")
+        return 1
+
+    # المخطط وترحيل الملفات القديمة مرة واحدة هنا؛ العمال لا يكررونها
+    from main import DATABASE_FILE, prepare_storage
+    db = Database(DATABASE_FILE)
+    try:
+        prepare_storage(db)
+    finally:
+        db.close()
+
+    workers = start_workers(args.workers, config.WORKER_BASE_PORT)
+    try:
+        asyncio.run(run_front(args.workers, config.WEBHOOK_HOST, config.PORT, config.WEBHOOK_PATH,
+                              url=config.WEBHOOK_URL, secret_token=config.WEBHOOK_SECRET))
+    finally:
+        stop_workers(workers)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
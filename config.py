@@ -5,3 +5,46 @@ load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ADMIN_IDS = os.getenv('ADMIN_IDS', '').split(',')
+
+# وضع التشغيل: polling (الافتراضي) أو webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# إعدادات webhook: يُسجَّل العنوان لدى تليجرام فقط إذا تم تعيين WEBHOOK_URL.
+# دون WEBHOOK_URL وWEBHOOK_SECRET لا يتحقق الخادم من مصدر الطلبات، فيستمع على 127.0.0.1 افتراضياً
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST') or ('0.0.0.0' if WEBHOOK_URL or WEBHOOK_SECRET else '127.0.0.1')
+PORT = int(os.getenv('PORT', '8080'))
+
+# عنوان بديل لواجهة Bot API (مثلاً خادم محلي للتجربة)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', '')
+
+# معالجة التحديثات: عدد التحديثات المتوازية والحد الأقصى للتحديثات المنتظرة
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+MAX_PENDING_UPDATES = int(os.getenv('MAX_PENDING_UPDATES', '1000'))
+
+# الاختبارات المؤقتة بالثواني (0 = بدون حد): لكل سؤال وللاختبار كاملاً
+QUESTION_TIME_LIMIT = int(os.getenv('QUESTION_TIME_LIMIT', '0'))
+TEST_TIME_LIMIT = int(os.getenv('TEST_TIME_LIMIT', '0'))
+TIMER_TICK = float(os.getenv('TIMER_TICK', '1'))
+
+# الاختبار المباشر: عدد الرسائل المتزامنة عند الإرسال للطلاب، وفترة تحديث لوحة المعلم بالثواني
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+LIVE_TALLY_INTERVAL = float(os.getenv('LIVE_TALLY_INTERVAL', '2'))
+
+# حد الرسائل الصادرة في الثانية للبوت كله (يُقسم على العمال)؛ 0 يعطّل محدد المعدل (لأدوات القياس فقط)
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '30'))
+
+# التشغيل بعدة عمال (cluster.py): رقم هذا العامل وعددهم، ومنفذ أول عامل،
+# وكل كم ثانية يقرأ العامل ما كتبه الآخرون في قاعدة البيانات المشتركة
+WORKER_INDEX = int(os.getenv('WORKER_INDEX', '0'))
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', '8081'))
+SHARED_STATE_REFRESH = float(os.getenv('SHARED_STATE_REFRESH', '10'))
+
+# منفذ /metrics في وضع polling (0 يعطّله؛ في وضع webhook تُعرض على منفذ الخادم نفسه)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# الاختيار التكيفي: كل سؤال يُختار قريباً من مستوى الطالب حسب صعوبة الأسئلة المقدَّرة من الإجابات
+ADAPTIVE_SELECTION = os.getenv('ADAPTIVE_SELECTION', '0') == '1'
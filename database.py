@@ -1,54 +1,475 @@
-import sqlite3
+import asyncio
 import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# الفصل الذي تنتمي إليه البيانات السابقة لدعم تعدد الفصول
+DEFAULT_CLASS_ID = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    join_code TEXT NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS memberships (
+    user_id TEXT NOT NULL,
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    role TEXT NOT NULL,
+    PRIMARY KEY (user_id, class_id)
+);
+CREATE INDEX IF NOT EXISTS idx_memberships_class ON memberships (class_id, role);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_id INTEGER NOT NULL DEFAULT 1,
+    type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT,
+    correct INTEGER NOT NULL,
+    photo_id TEXT,
+    category TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_questions_class ON questions (class_id, id);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT,
+    class_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_id INTEGER NOT NULL DEFAULT 1,
+    user_id TEXT NOT NULL REFERENCES users (user_id),
+    date TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_results_class_user ON results (class_id, user_id, id);
+
+CREATE TABLE IF NOT EXISTS student_stats (
+    class_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    tests INTEGER NOT NULL,
+    total_percentage REAL NOT NULL,
+    best_percentage REAL NOT NULL,
+    PRIMARY KEY (class_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id INTEGER PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS media_cache (
+    content_hash TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS score_histogram (
+    class_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    tests INTEGER NOT NULL,
+    PRIMARY KEY (class_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+'''
+
+# تحويل صف من جدول الأسئلة إلى الشكل الذي تستخدمه المعالجات
+def row_to_question(row):
+    question = {"id": row["id"], "type": row["type"], "question": row["question"]}
+    if row["type"] == "multiple_choice":
+        question["options"] = json.loads(row["options"]) if row["options"] else []
+        question["correct_option"] = row["correct"]
+    else:
+        question["correct_answer"] = bool(row["correct"])
+    if row["photo_id"]:
+        question["photo_id"] = row["photo_id"]
+    if row["category"]:
+        question["category"] = row["category"]
+    return question
+
+def question_to_row(question):
+    if question.get("type") == "multiple_choice":
+        correct = int(question.get("correct_option", 0))
+        options = json.dumps(question.get("options", []), ensure_ascii=False)
+    else:
+        correct = 1 if question.get("correct_answer", True) else 0
+        options = None
+    return (question.get("class_id", DEFAULT_CLASS_ID), question.get("type", "multiple_choice"), question["question"],
+            options, correct, question.get("photo_id"), question.get("category"))
+
+def new_join_code():
+    return secrets.token_hex(4).upper()
+
+# فئة الدرجة في المدرج التكراري: 0-9% -> 0 ... 100% -> 10
+def score_bucket(percentage):
+    return min(int(percentage // 10), 10)
+
+# محرك التخزين: اتصال SQLite دائم لكل خيط في مجمع صغير، بوضع WAL
+# initialized: المخطط هُيّئ مسبقاً في عملية أخرى (عمال cluster.py) فلا يُعاد تنفيذ init
+class Database:
+    def __init__(self, path, pool_size=4, initialized=False):
+        self.path = path
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._executor = None
+        self._ready = initialized
+        # زمن كل عملية (داخل الخيط)، وانتظار خيط متاح، وانتظار قفل الكتابة
+        self.latency = defaultdict(LatencyStats)
+        self.queue_wait = LatencyStats()
+        self.write_wait = LatencyStats()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    # تنفيذ دالة متزامنة في مجمع الخيوط دون حجب حلقة الأحداث
+    async def run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db")
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        timing = []
+
+        def call():
+            timing.append(time.perf_counter())
+            try:
+                return fn(*args)
+            finally:
+                timing.append(time.perf_counter())
+
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            # التسجيل في حلقة الأحداث فقط حتى لا تتسابق الخيوط على العدّادات
+            if len(timing) == 2:
+                self.queue_wait.observe(timing[0] - submitted)
+                self.latency[getattr(fn, "__name__", "call")].observe(timing[1] - timing[0])
+
+    # الكتابة عبر كاتب واحد في معاملة واحدة
+    def write(self, fn):
+        waiting = time.perf_counter()
+        with self._write_lock:
+            # داخل القفل: كاتب واحد فقط يحدّث هذا العدّاد
+            self.write_wait.observe(time.perf_counter() - waiting)
+            conn = self._connection()
+            with conn:
+                return fn(conn)
+
+    def read(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _columns(self, conn, table):
+        return [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    def init(self):
+        if self._ready:
+            return
+        conn = self._connection()
+        columns = self._columns(conn, "questions")
+        if columns and "question" not in columns:
+            # جدول الأسئلة القديم (صور فقط) لا يتوافق مع المخطط الجديد
+            conn.execute("ALTER TABLE questions RENAME TO questions_legacy")
+            logger.warning("تمت إعادة تسمية جدول الأسئلة القديم إلى questions_legacy")
+        elif columns and "category" not in columns:
+            conn.execute("ALTER TABLE questions ADD COLUMN category TEXT")
+        self._migrate_classes(conn)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO classes (id, name, join_code) VALUES (?, ?, ?)",
+                     (DEFAULT_CLASS_ID, "الفصل الافتراضي", new_join_code()))
+        conn.commit()
+        self._backfill_stats(conn)
+        self._ready = True
+
+    # قواعد البيانات السابقة لتعدد الفصول: كل البيانات تنتمي للفصل الافتراضي
+    def _migrate_classes(self, conn):
+        for table, ddl in (("questions", "class_id INTEGER NOT NULL DEFAULT 1"),
+                           ("results", "class_id INTEGER NOT NULL DEFAULT 1"),
+                           ("users", "class_id INTEGER")):
+            columns = self._columns(conn, table)
+            if columns and "class_id" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+        # الإحصاءات التراكمية مشتقة من النتائج، فيُعاد حسابها لكل فصل
+        columns = self._columns(conn, "student_stats")
+        if columns and "class_id" not in columns:
+            conn.execute("DROP TABLE student_stats")
+            conn.execute("DROP TABLE IF EXISTS score_histogram")
+        conn.commit()
+
+    # حساب إحصاءات الطلاب من النتائج الموجودة إذا أُنشئت الجداول بعد تسجيل نتائج
+    def _backfill_stats(self, conn):
+        if conn.execute("SELECT 1 FROM student_stats LIMIT 1").fetchone():
+            return
+        if not conn.execute("SELECT 1 FROM results LIMIT 1").fetchone():
+            return
+        with conn:
+            conn.execute(
+                "INSERT INTO student_stats (class_id, user_id, tests, total_percentage, best_percentage) "
+                "SELECT class_id, user_id, COUNT(*), SUM(percentage), MAX(percentage) FROM results GROUP BY class_id, user_id"
+            )
+            conn.execute(
+                "INSERT INTO score_histogram (class_id, bucket, tests) "
+                "SELECT class_id, MIN(CAST(percentage / 10 AS INTEGER), 10), COUNT(*) FROM results GROUP BY 1, 2"
+            )
+        logger.info("تم حساب الإحصاءات من النتائج السابقة")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # الأسئلة
+    def add_question(self, question):
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT INTO questions (class_id, type, question, options, correct, photo_id, category) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                question_to_row(question),
+            )
+            return cursor.lastrowid
+        saved = dict(question)
+        saved["id"] = self.write(insert)
+        return saved
+
+    # إضافة دفعة من الأسئلة في معاملة واحدة، وإرجاعها مع معرّفاتها
+    def add_questions(self, questions):
+        def insert(conn):
+            saved = []
+            for question in questions:
+                cursor = conn.execute(
+                    "INSERT INTO questions (class_id, type, question, options, correct, photo_id, category) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    question_to_row(question),
+                )
+                saved.append(dict(question, id=cursor.lastrowid))
+            return saved
+        return self.write(insert)
+
+    # قراءة الأسئلة على دفعات حسب المعرّف دون تحميلها كلها في الذاكرة
+    def iter_questions(self, class_id=None, batch_size=1000, after_id=0):
+        last_id = after_id
+        while True:
+            if class_id is None:
+                rows = self.read("SELECT * FROM questions WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            else:
+                rows = self.read("SELECT * FROM questions WHERE class_id = ? AND id > ? ORDER BY id LIMIT ?",
+                                 (class_id, last_id, batch_size))
+            if not rows:
+                return
+            for row in rows:
+                yield row_to_question(row)
+            last_id = rows[-1]["id"]
+
+    def list_questions(self, class_id=DEFAULT_CLASS_ID):
+        rows = self.read("SELECT * FROM questions WHERE class_id = ? ORDER BY id", (class_id,))
+        return [row_to_question(row) for row in rows]
+
+    def count_questions(self, class_id=DEFAULT_CLASS_ID):
+        return self.read("SELECT COUNT(*) AS n FROM questions WHERE class_id = ?", (class_id,))[0]["n"]
+
+    def questions_page(self, class_id, offset, limit):
+        rows = self.read("SELECT * FROM questions WHERE class_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                         (class_id, limit, offset))
+        return [row_to_question(row) for row in rows]
+
+    # النتائج
+    # حفظ نتيجة اختبار وتحديث الإحصاءات التراكمية في المعاملة نفسها
+    def _insert_result(self, conn, user_id, name, test, answers=(), class_id=DEFAULT_CLASS_ID):
+        user_id = str(user_id)
+        percentage = test["percentage"]
+        conn.execute(
+            "INSERT INTO users (user_id, name) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET name = excluded.name",
+            (user_id, name),
+        )
+        conn.execute(
+            "INSERT INTO results (class_id, user_id, date, score, total, percentage) VALUES (?, ?, ?, ?, ?, ?)",
+            (class_id, user_id, test["date"], test["score"], test["total"], percentage),
+        )
+        conn.execute(
+            "INSERT INTO student_stats (class_id, user_id, tests, total_percentage, best_percentage) VALUES (?, ?, 1, ?, ?) "
+            "ON CONFLICT (class_id, user_id) DO UPDATE SET tests = tests + 1, "
+            "total_percentage = total_percentage + excluded.total_percentage, "
+            "best_percentage = MAX(best_percentage, excluded.best_percentage)",
+            (class_id, user_id, percentage, percentage),
+        )
+        conn.execute(
+            "INSERT INTO score_histogram (class_id, bucket, tests) VALUES (?, ?, 1) "
+            "ON CONFLICT (class_id, bucket) DO UPDATE SET tests = tests + 1",
+            (class_id, score_bucket(percentage)),
+        )
+        conn.executemany(
+            "INSERT INTO question_stats (question_id, attempts, correct) VALUES (?, 1, ?) "
+            "ON CONFLICT (question_id) DO UPDATE SET attempts = attempts + 1, correct = correct + excluded.correct",
+            [(question_id, 1 if correct else 0) for question_id, correct in answers],
+        )
+
+    def add_result(self, user_id, name, test, answers=(), class_id=DEFAULT_CLASS_ID):
+        self.write(lambda conn: self._insert_result(conn, user_id, name, test, answers, class_id))
+
+    def add_results(self, records):
+        def insert(conn):
+            for record in records:
+                score = record.get("score", 0)
+                total = record.get("total", 0)
+                self._insert_result(conn, record["user_id"], record.get("name"), {
+                    "date": record.get("date", ""),
+                    "score": score,
+                    "total": total,
+                    "percentage": record.get("percentage", (score / total) * 100 if total > 0 else 0),
+                }, record.get("answers", ()), record.get("class_id", DEFAULT_CLASS_ID))
+        self.write(insert)
+
+    def results_for_user(self, user_id, class_id=DEFAULT_CLASS_ID):
+        rows = self.read(
+            "SELECT u.name, r.date, r.score, r.total, r.percentage FROM results r "
+            "JOIN users u ON u.user_id = r.user_id WHERE r.class_id = ? AND r.user_id = ? ORDER BY r.id",
+            (class_id, str(user_id)),
+        )
+        if not rows:
+            return {}
+        tests = [{"date": row["date"], "score": row["score"], "total": row["total"], "percentage": row["percentage"]} for row in rows]
+        return {"name": rows[0]["name"], "tests": tests}
+
+    def count_results(self, class_id=DEFAULT_CLASS_ID):
+        return self.read("SELECT COUNT(*) AS n FROM results WHERE class_id = ?", (class_id,))[0]["n"]
+
+    # صفحة من النتائج مرتبة حسب الطالب
+    def results_page(self, class_id, offset, limit):
+        rows = self.read(
+            "SELECT r.user_id, u.name, r.date, r.score, r.total, r.percentage FROM results r "
+            "JOIN users u ON u.user_id = r.user_id WHERE r.class_id = ? ORDER BY r.user_id, r.id LIMIT ? OFFSET ?",
+            (class_id, limit, offset),
+        )
+        return [dict(row) for row in rows]
+
+    # جلسات الاختبار
+    # shard=(رقم العامل، عدد العمال): جلسات مستخدمي هذا العامل فقط
+    def load_sessions(self, cutoff, shard=None):
+        def expire(conn):
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+        self.write(expire)
+        if shard is None:
+            rows = self.read("SELECT user_id, data FROM sessions")
+        else:
+            index, count = shard
+            rows = self.read("SELECT user_id, data FROM sessions WHERE user_id % ? = ?", (count, index))
+        return [(row["user_id"], row["data"]) for row in rows]
+
+    def save_sessions(self, sessions, now):
+        def save(conn):
+            conn.executemany(
+                "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(user_id, data, now) for user_id, data in sessions.items() if data is not None],
+            )
+            conn.executemany(
+                "DELETE FROM sessions WHERE user_id = ?",
+                [(user_id,) for user_id, data in sessions.items() if data is None],
+            )
+        self.write(save)
+
+    # ذاكرة file_id للصور حسب بصمة المحتوى
+    def get_media_file_id(self, content_hash):
+        rows = self.read("SELECT file_id FROM media_cache WHERE content_hash = ?", (content_hash,))
+        return rows[0]["file_id"] if rows else None
+
+    def save_media_file_id(self, content_hash, file_id):
+        self.write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO media_cache (content_hash, file_id) VALUES (?, ?)", (content_hash, file_id)))
+
+    # الإحصاءات التراكمية لفصل واحد
+    def load_stats(self, class_id=DEFAULT_CLASS_ID):
+        return {
+            "students": [tuple(row) for row in self.read(
+                "SELECT user_id, tests, total_percentage, best_percentage FROM student_stats WHERE class_id = ?",
+                (class_id,))],
+            "questions": [tuple(row) for row in self.read(
+                "SELECT s.question_id, s.attempts, s.correct FROM questions q "
+                "JOIN question_stats s ON s.question_id = q.id WHERE q.class_id = ?", (class_id,))],
+            "histogram": [tuple(row) for row in self.read(
+                "SELECT bucket, tests FROM score_histogram WHERE class_id = ?", (class_id,))],
+        }
+
+    # محاولات وإجابات كل سؤال في الفصل {معرّف السؤال: (المحاولات، الصحيحة)}
+    def question_stats(self, class_id=DEFAULT_CLASS_ID):
+        return {row[0]: (row[1], row[2]) for row in self.read(
+            "SELECT s.question_id, s.attempts, s.correct FROM questions q "
+            "JOIN question_stats s ON s.question_id = q.id WHERE q.class_id = ?", (class_id,))}
+
+    # الفصول والعضويات (الأدوار: admin أو student)
+    def list_classes(self):
+        return [dict(row) for row in self.read("SELECT id, name, join_code FROM classes ORDER BY id")]
+
+    def create_class(self, name):
+        join_code = new_join_code()
+        class_id = self.write(lambda conn: conn.execute(
+            "INSERT INTO classes (name, join_code) VALUES (?, ?)", (name, join_code)).lastrowid)
+        return {"id": class_id, "name": name, "join_code": join_code}
+
+    def load_memberships(self):
+        return [tuple(row) for row in self.read("SELECT user_id, class_id, role FROM memberships")]
+
+    def load_active_classes(self):
+        return [tuple(row) for row in self.read("SELECT user_id, class_id FROM users WHERE class_id IS NOT NULL")]
+
+    # تسجيل عضو في فصل وجعله الفصل الحالي له
+    def set_membership(self, user_id, name, class_id, role):
+        def save(conn):
+            conn.execute(
+                "INSERT INTO users (user_id, name, class_id) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET name = COALESCE(excluded.name, name), class_id = excluded.class_id",
+                (str(user_id), name, class_id),
+            )
+            conn.execute(
+                "INSERT INTO memberships (user_id, class_id, role) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, class_id) DO UPDATE SET role = excluded.role",
+                (str(user_id), class_id, role),
+            )
+        self.write(save)
 
-def init_db():
-    conn = sqlite3.connect('questions.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        photo_id TEXT NOT NULL,
-        type TEXT NOT NULL,
-        correct_answer TEXT NOT NULL,
-        options TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def add_question(photo_id, q_type, correct_answer, options=None):
-    conn = sqlite3.connect('questions.db')
-    cursor = conn.cursor()
-    
-    options_json = json.dumps(options) if options else None
-    
-    cursor.execute('''
-    INSERT INTO questions (photo_id, type, correct_answer, options)
-    VALUES (?, ?, ?, ?)
-    ''', (photo_id, q_type, correct_answer, options_json))
-    
-    conn.commit()
-    conn.close()
-
-def get_random_question():
-    conn = sqlite3.connect('questions.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM questions ORDER BY RANDOM() LIMIT 1')
-    row = cursor.fetchone()
-    
-    conn.close()
-    
-    if row:
-        question = dict(row)
-        if question['options']:
-            question['options'] = json.loads(question['options'])
-        return question
-    return None
-
-# تهيئة قاعدة البيانات عند الاستيراد
-init_db()
+    def set_active_class(self, user_id, class_id):
+        self.write(lambda conn: conn.execute(
+            "UPDATE users SET class_id = ? WHERE user_id = ?", (class_id, str(user_id))))
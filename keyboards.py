@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# لوحات الأزرار الثابتة: تُبنى مرة واحدة عند الاستيراد وتُعاد في كل رد
+# (كائنات InlineKeyboardMarkup في المكتبة غير قابلة للتعديل، فمشاركتها آمنة)
+ADMIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
+    [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
+    [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
+    [InlineKeyboardButton("🎯 اختبار مباشر للفصل", callback_data="live_start")],
+    [InlineKeyboardButton("📊 عرض النتائج", callback_data="view_results")]
+])
+
+STUDENT_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
+    [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")]
+])
+
+# القائمة بعد حفظ سؤال جديد
+QUESTION_SAVED_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
+    [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
+    [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")]
+])
+
+QUESTION_TYPE_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("اختيار من متعدد", callback_data="add_multiple")],
+    [InlineKeyboardButton("صح/خطأ", callback_data="add_true_false")],
+    [InlineKeyboardButton("رجوع", callback_data="back_to_main")]
+])
+
+# اختيار الإجابة الصحيحة عند إضافة سؤال صح/خطأ
+CORRECT_ANSWER_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ صح", callback_data="set_true")],
+    [InlineKeyboardButton("❌ خطأ", callback_data="set_false")]
+])
+
+HOME_BUTTON = InlineKeyboardButton("🏠 الرئيسية", callback_data="back_to_main")
+HOME_MENU = InlineKeyboardMarkup([[HOME_BUTTON]])
+
+RESULT_MENU = InlineKeyboardMarkup([
+    [HOME_BUTTON],
+    [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")]
+])
+
+ADMIN_RESULT_MENU = InlineKeyboardMarkup([
+    [HOME_BUTTON],
+    [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")],
+    [InlineKeyboardButton("📋 إدارة الأسئلة", callback_data="add_question")]
+])
+
+TRUE_FALSE_ANSWERS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ صح", callback_data="answer_1")],
+    [InlineKeyboardButton("❌ خطأ", callback_data="answer_0")]
+])
+
+# أزرار سؤال اختيار من متعدد تعتمد على نصوص الخيارات فقط، فتُبنى مرة لكل مجموعة خيارات
+@lru_cache(maxsize=4096)
+def choices_keyboard(options):
+    return InlineKeyboardMarkup([[InlineKeyboardButton(f"{i+1}. {option}", callback_data=f"answer_{i}")]
+                                 for i, option in enumerate(options)])
+
+def question_keyboard(question):
+    if question.get("type") == "multiple_choice":
+        return choices_keyboard(tuple(question.get("options", [])))
+    return TRUE_FALSE_ANSWERS
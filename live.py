@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, TelegramError
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 10
+LIVE_ANSWER_PREFIX = "live_answer:"
+
+# صاحب الاختبار المباشر من بيانات زر الإجابة (live_answer:فصل:سؤال:خيار:المعلم)،
+# ليصل التحديث إلى العامل الذي يحتفظ بالعدّادات
+def live_answer_owner(data):
+    if not data.startswith(LIVE_ANSWER_PREFIX):
+        return None
+    parts = data.split(":")
+    return int(parts[4]) if len(parts) == 5 and parts[4].isdigit() else None
+
+# إرسال رسالة لكل المحادثات بعدد محدود من الطلبات المتزامنة.
+# send(chat_id) تُرجع الرسالة المرسلة؛ النتيجة {chat_id: message_id} لمن وصلتهم الرسالة
+async def broadcast(chat_ids, send, concurrency=20):
+    delivered = {}
+    pending = iter(chat_ids)
+
+    async def worker():
+        for chat_id in pending:
+            try:
+                message = await send(chat_id)
+                delivered[chat_id] = message.message_id
+            except Forbidden:
+                # الطالب حظر البوت أو لم يبدأ محادثة معه
+                pass
+            except TelegramError as exc:
+                logger.warning("تعذر الإرسال إلى %s: %s", chat_id, exc)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return delivered
+
+# اختبار مباشر يديره المعلم: سؤال واحد للجميع في كل مرة، والعدّ في الذاكرة
+class LiveQuiz:
+    def __init__(self, class_id, admin_id, questions):
+        self.class_id = class_id
+        self.admin_id = admin_id
+        self.questions = questions
+        self.current = -1
+        self.tallies = []
+        self.answered = set()
+        self.scores = {}
+        self.names = {}
+        self.answers = {}
+        self.version = 0
+        self.rendered_version = -1
+        self.tally_chat_id = None
+        self.tally_message_id = None
+        self.participants = 0
+
+    @property
+    def question(self):
+        if 0 <= self.current < len(self.questions):
+            return self.questions[self.current]
+        return None
+
+    # عدد الأسئلة التي أُرسلت حتى الآن
+    @property
+    def asked(self):
+        return min(self.current + 1, len(self.questions))
+
+    def next_question(self):
+        self.current += 1
+        question = self.question
+        if question is not None:
+            self.tallies = [0] * (len(question["options"]) if question["type"] == "multiple_choice" else 2)
+            self.answered = set()
+            self.version += 1
+        return question
+
+    # تسجيل إجابة: None إذا كانت لسؤال مغلق أو مكررة، وإلا هل هي صحيحة
+    def answer(self, user_id, name, question_index, answer_index, correct):
+        if question_index != self.current or user_id in self.answered:
+            return None
+        if not 0 <= answer_index < len(self.tallies):
+            return None
+        self.answered.add(user_id)
+        self.tallies[answer_index] += 1
+        self.names[user_id] = name
+        self.scores[user_id] = self.scores.get(user_id, 0) + (1 if correct else 0)
+        self.answers.setdefault(user_id, []).append((self.question["id"], correct))
+        self.version += 1
+        return correct
+
+    def leaderboard(self, n=LEADERBOARD_SIZE):
+        return heapq.nlargest(n, self.scores.items(), key=lambda item: item[1])
+
+    def render_tally(self):
+        question = self.question
+        if question is None:
+            return "⏹️ انتهى الاختبار المباشر"
+        if question["type"] == "multiple_choice":
+            labels = [f"{i + 1}. {option}" for i, option in enumerate(question["options"])]
+        else:
+            labels = ["❌ خطأ", "✅ صح"]
+        answered = f"{len(self.answered)}/{self.participants}" if self.participants else str(len(self.answered))
+        peak = max(self.tallies) or 1
+        text = (f"🎯 اختبار مباشر - السؤال {self.current + 1}/{len(self.questions)}\n\n{question['question']}\n\n"
+                f"الإجابات: {answered}\n")
+        for label, count in zip(labels, self.tallies):
+            text += f"{label}: {'▇' * round(10 * count / peak)} {count}\n"
+        return text[:4000]
+
+    def render_leaderboard(self):
+        text = f"🏆 النتائج النهائية ({len(self.scores)} مشارك):\n\n"
+        medals = ["🥇", "🥈", "🥉"]
+        for rank, (user_id, score) in enumerate(self.leaderboard()):
+            prefix = medals[rank] if rank < len(medals) else f"{rank + 1}."
+            text += f"{prefix} {self.names.get(user_id, user_id)}: {score}/{self.asked}\n"
+        return text
+
+    def teacher_keyboard(self):
+        if self.current + 1 < len(self.questions):
+            first = InlineKeyboardButton("➡️ السؤال التالي", callback_data="live_next")
+        else:
+            first = InlineKeyboardButton("🏁 إظهار النتائج", callback_data="live_next")
+        return InlineKeyboardMarkup([[first], [InlineKeyboardButton("⏹️ إنهاء", callback_data="live_stop")]])
+
+    def _answer_data(self, answer_index):
+        return f"{LIVE_ANSWER_PREFIX}{self.class_id}:{self.current}:{answer_index}:{self.admin_id}"
+
+    def student_keyboard(self):
+        question = self.question
+        if question["type"] == "multiple_choice":
+            keyboard = [[InlineKeyboardButton(f"{i + 1}. {option}", callback_data=self._answer_data(i))]
+                        for i, option in enumerate(question["options"])]
+        else:
+            keyboard = [
+                [InlineKeyboardButton("✅ صح", callback_data=self._answer_data(1))],
+                [InlineKeyboardButton("❌ خطأ", callback_data=self._answer_data(0))]
+            ]
+        return InlineKeyboardMarkup(keyboard)
@@ -1,10 +1,29 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-import json
+from telegram import Chat, Message, Update
+from telegram.error import BadRequest
+from telegram.ext import Application, CallbackContext, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+import asyncio
 import os
+import tempfile
+import time
 from datetime import datetime
 
+import config
+from database import DEFAULT_CLASS_ID, Database
+from keyboards import (ADMIN_MENU, ADMIN_RESULT_MENU, CORRECT_ANSWER_MENU, HOME_MENU, QUESTION_SAVED_MENU,
+                       QUESTION_TYPE_MENU, RESULT_MENU, STUDENT_MENU, question_keyboard)
+from live import LiveQuiz, broadcast
+from media import show_content
+from metrics import COUNTERS, active_sessions, timed
+from persistence import SQLitePersistence
+from ratelimit import TelegramRateLimiter
+from scheduler import PerUserUpdateProcessor
+from sampler import rating_from_rate
+from timers import TimerWheel
+from store import migrate_legacy_files
+from tenancy import ROLE_ADMIN, Tenancy
+from views import PageCache, get_page, parse_page
+
 # إعدادات التسجيل
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -13,61 +32,59 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ملفات التخزين
+DATABASE_FILE = os.getenv("DATABASE_FILE", "questions.db")
 QUESTIONS_FILE = "questions.json"
-RESULTS_FILE = "results.json"
+RESULTS_FILE = "results.jsonl"
+LEGACY_RESULTS_FILE = "results.json"
+
+# عدد أسئلة الاختبار وعدد الأسئلة الأخيرة التي لا تتكرر للطالب
+TEST_SIZE = 5
+RECENT_QUESTIONS_WINDOW = 20
+LIVE_QUIZ_SIZE = 10
+
+# مفاتيح جلسة الاختبار في user_data، ومدة بقاء الجلسة المتروكة
+TEST_SESSION_KEYS = ("test_question_ids", "test_size", "current_question", "score", "answers", "last_activity", "name", "class_id",
+                     "chat_id", "message_id", "message_photo", "test_started", "test_deadline", "question_deadline")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_FLUSH_INTERVAL = int(os.getenv("SESSION_FLUSH_INTERVAL", "10"))
 
 # حالات المحادثة
 STATE_ADD_QUESTION = 1
 STATE_ADD_OPTIONS = 2
 STATE_ADD_CORRECT_ANSWER = 3
 
-# تحميل الأسئلة من الملف
-def load_questions():
-    if os.path.exists(QUESTIONS_FILE):
-        with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"multiple_choice": [], "true_false": []}
-
-# حفظ الأسئلة في الملف
-def save_questions(questions):
-    with open(QUESTIONS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(questions, f, ensure_ascii=False, indent=2)
-
-# تحميل النتائج
-def load_results():
-    if os.path.exists(RESULTS_FILE):
-        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-# حفظ النتائج
-def save_results(results):
-    with open(RESULTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+# هل المستخدم معلم في فصله الحالي (بحث في الذاكرة دون قاعدة البيانات)
+def is_admin(context, user_id):
+    return context.bot_data["tenancy"].is_admin(user_id)
+
+# بنك أسئلة الفصل الذي بدأ فيه الطالب اختباره الحالي
+async def session_store(context):
+    return await context.bot_data["tenancy"].store(context.user_data.get("class_id", DEFAULT_CLASS_ID))
+
+# حفظ سؤال جديد في قاعدة البيانات ونسخة الذاكرة لفصل المعلم
+async def save_question(context, user_id, question):
+    tenancy = context.bot_data["tenancy"]
+    class_id = tenancy.class_of(user_id)
+    store = await tenancy.store(class_id)
+    await store.add(question)
+    context.bot_data["page_cache"].invalidate(("view_questions", class_id))
 
 # أوامر البوت
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    keyboard = []
     
-    if str(user.id) == context.bot_data.get("admin_id", ""):
+    if is_admin(context, user.id):
         # واجهة المدير (المعلم)
-        keyboard = [
-            [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
-            [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
-            [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
-            [InlineKeyboardButton("📊 عرض النتائج", callback_data="view_results")]
-        ]
+        reply_markup = ADMIN_MENU
         message = f"مرحباً أستاذ {user.first_name}! اختر من القائمة:"
     else:
-        # واجهة الطالب
-        keyboard = [
-            [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
-            [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")]
-        ]
+        # واجهة الطالب (من لم ينضم لأي فصل يُسجَّل في الفصل الافتراضي)
+        tenancy = context.bot_data["tenancy"]
+        if not tenancy.is_member(user.id):
+            await tenancy.join(user.id, user.first_name, tenancy.class_of(user.id))
+        reply_markup = STUDENT_MENU
         message = f"مرحباً {user.first_name}! اختر من القائمة:"
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(message, reply_markup=reply_markup)
 
 # التعامل مع الأزرار
@@ -78,115 +95,102 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(query.from_user.id)
     
     if query.data == "add_question":
-        if user_id != context.bot_data.get("admin_id", ""):
+        if not is_admin(context, user_id):
             await query.edit_message_text("⛔ هذا الأمر للمعلم فقط!")
             return
         
-        keyboard = [
-            [InlineKeyboardButton("اختيار من متعدد", callback_data="add_multiple")],
-            [InlineKeyboardButton("صح/خطأ", callback_data="add_true_false")],
-            [InlineKeyboardButton("رجوع", callback_data="back_to_main")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("اختر نوع السؤال:", reply_markup=reply_markup)
+        await query.edit_message_text("اختر نوع السؤال:", reply_markup=QUESTION_TYPE_MENU)
     
     elif query.data in ["add_multiple", "add_true_false"]:
         context.user_data["question_type"] = "multiple_choice" if query.data == "add_multiple" else "true_false"
         context.user_data["state"] = STATE_ADD_QUESTION
-        await query.edit_message_text("أرسل نص السؤال:")
+        await query.edit_message_text("أرسل نص السؤال (أو صورة مع وصف):")
     
-    elif query.data == "view_questions":
-        questions = load_questions()
-        if not questions["multiple_choice"] and not questions["true_false"]:
-            await query.edit_message_text("لا توجد أسئلة بعد.")
-        else:
-            text = "📋 قائمة الأسئلة:\n\n"
-            for i, q in enumerate(questions["multiple_choice"], 1):
-                text += f"{i}. ❓ {q['question']} (اختيار من متعدد)\n"
-            for i, q in enumerate(questions["true_false"], 1):
-                text += f"{i+len(questions['multiple_choice'])}. ❓ {q['question']} (صح/خطأ)\n"
-            await query.edit_message_text(text[:4000])
+    elif query.data == "view_questions" or query.data.startswith("view_questions:"):
+        text, reply_markup = await get_page(context, "view_questions", parse_page(query.data),
+                                            context.bot_data["tenancy"].class_of(user_id))
+        await query.edit_message_text(text, reply_markup=reply_markup)
     
     elif query.data == "start_test":
-        questions = load_questions()
-        all_questions = questions["multiple_choice"] + questions["true_false"]
+        # اختيار 5 أسئلة عشوائية لم يرها الطالب مؤخراً، أو في الوضع التكيفي
+        # السؤال الأول فقط والبقية واحداً بعد الآخر حسب إجاباته
+        class_id = context.bot_data["tenancy"].class_of(user_id)
+        store = await context.bot_data["tenancy"].store(class_id)
+        if config.ADAPTIVE_SELECTION:
+            first = store.next_adaptive(user_id, prior=await student_prior(context, class_id, user_id))
+            test_questions = [first] if first else []
+        else:
+            test_questions = store.sample(TEST_SIZE, user_id=user_id)
         
-        if not all_questions:
+        if not test_questions:
             await query.edit_message_text("لا توجد أسئلة متاحة للاختبار.")
             return
         
-        # اختيار 5 أسئلة عشوائية
-        import random
-        test_questions = random.sample(all_questions, min(5, len(all_questions)))
-        
-        context.user_data["test_questions"] = test_questions
+        # الجلسة تحفظ معرّفات الأسئلة وأرقام الإجابات فقط
+        context.user_data["test_question_ids"] = [q["id"] for q in test_questions]
+        context.user_data["test_size"] = min(TEST_SIZE, store.count()) if config.ADAPTIVE_SELECTION else len(test_questions)
+        context.user_data["class_id"] = class_id
         context.user_data["current_question"] = 0
         context.user_data["score"] = 0
         context.user_data["answers"] = []
+        context.user_data["last_activity"] = time.time()
+        context.user_data["name"] = query.from_user.first_name
+        context.user_data["test_started"] = time.time()
+        COUNTERS["tests_started"] += 1
+        if config.TEST_TIME_LIMIT:
+            context.user_data["test_deadline"] = context.user_data["test_started"] + config.TEST_TIME_LIMIT
+            context.bot_data["timers"].schedule((query.from_user.id, "test"), context.user_data["test_deadline"],
+                                                context.user_data["test_started"])
         
-        await show_question(query, context)
+        await show_question(query.message, context, query.from_user.id)
     
     elif query.data.startswith("answer_"):
         # معالجة إجابة الطالب
         answer_index = int(query.data.split("_")[1])
-        test_questions = context.user_data.get("test_questions", [])
+        question_ids = context.user_data.get("test_question_ids", [])
         current_index = context.user_data.get("current_question", 0)
         
-        if current_index < len(test_questions):
-            question = test_questions[current_index]
-            is_correct = False
-            
-            if question.get("type") == "multiple_choice":
-                correct_option = question.get("correct_option", 0)
-                is_correct = (answer_index == correct_option)
-            else:  # true/false
-                correct_answer = question.get("correct_answer", True)
-                is_correct = (answer_index == 1 and correct_answer) or (answer_index == 0 and not correct_answer)
+        # تجاهل الضغط على رسالة قديمة (مثلاً بعد انتهاء وقت السؤال)
+        if query.message.message_id != context.user_data.get("message_id", query.message.message_id):
+            return
+        
+        if current_index < len(question_ids):
+            store = await session_store(context)
+            question = store.get(question_ids[current_index])
             
-            context.user_data["answers"].append({
-                "question": question["question"],
-                "user_answer": answer_index,
-                "correct": is_correct
-            })
+            context.user_data["answers"].append(answer_index)
             
-            if is_correct:
-                context.user_data["score"] += 1
+            if question is not None:
+                correct = is_correct_answer(question, answer_index)
+                if correct:
+                    context.user_data["score"] += 1
+                # تحديث فهرس الصعوبة مع كل إجابة
+                store.record_answer(user_id, question["id"], correct,
+                                    await student_prior(context, store.class_id, user_id))
             
             # الانتقال للسؤال التالي
             context.user_data["current_question"] += 1
+            context.user_data["last_activity"] = time.time()
             current_index = context.user_data["current_question"]
             
-            if current_index < len(test_questions):
-                await show_question(query, context)
+            if current_index < test_length(context.user_data):
+                await show_question(query.message, context, query.from_user.id)
             else:
                 # نهاية الاختبار
-                await finish_test(query, context)
+                await finish_test(query.message, context, query.from_user.id, query.from_user.first_name)
     
-    elif query.data == "view_results":
-        if user_id != context.bot_data.get("admin_id", ""):
+    elif query.data == "view_results" or query.data.startswith("view_results:"):
+        if not is_admin(context, user_id):
             await query.edit_message_text("⛔ هذا الأمر للمعلم فقط!")
             return
         
-        results = load_results()
-        if not results:
-            await query.edit_message_text("لا توجد نتائج بعد.")
-        else:
-            text = "📊 النتائج:\n\n"
-            for student_id, student_results in results.items():
-                student_name = student_results.get("name", "مجهول")
-                text += f"👤 {student_name}:\n"
-                for result in student_results.get("tests", []):
-                    date = result.get("date", "غير معروف")
-                    score = result.get("score", 0)
-                    total = result.get("total", 1)
-                    percentage = (score / total) * 100 if total > 0 else 0
-                    text += f"   - {date}: {score}/{total} ({percentage:.1f}%)\n"
-                text += "\n"
-            await query.edit_message_text(text[:4000])
+        text, reply_markup = await get_page(context, "view_results", parse_page(query.data),
+                                            context.bot_data["tenancy"].class_of(user_id))
+        await query.edit_message_text(text, reply_markup=reply_markup)
     
     elif query.data == "my_results":
-        results = load_results()
-        user_results = results.get(user_id, {})
+        db = context.bot_data["db"]
+        user_results = await db.run(db.results_for_user, user_id, context.bot_data["tenancy"].class_of(user_id))
         
         if not user_results.get("tests", []):
             await query.edit_message_text("لا توجد نتائج سابقة لك.")
@@ -203,57 +207,105 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == "back_to_main":
         await start_callback(update, context)
 
-async def show_question(query, context):
-    test_questions = context.user_data.get("test_questions", [])
+# عدد أسئلة الاختبار الجاري (في الوضع التكيفي تُضاف الأسئلة إلى الجلسة واحداً بعد الآخر)
+def test_length(user_data):
+    return user_data.get("test_size", len(user_data.get("test_question_ids", [])))
+
+# المستوى الأولي للطالب في الاختيار التكيفي: متوسط نتائجه السابقة مقارنة بمتوسط الفصل
+async def student_prior(context, class_id, user_id):
+    stats = await context.bot_data["tenancy"].stats(class_id)
+    student = stats.student(user_id)
+    if student is None:
+        return 0.0
+    return rating_from_rate(student["mean"] / 100) - rating_from_rate(stats.mean() / 100)
+
+def is_correct_answer(question, answer_index):
+    if question.get("type") == "multiple_choice":
+        return answer_index == question.get("correct_option", 0)
+    # صح/خطأ
+    correct_answer = question.get("correct_answer", True)
+    return (answer_index == 1 and correct_answer) or (answer_index == 0 and not correct_answer)
+
+# حذف بيانات جلسة الاختبار بعد انتهائها
+def end_test_session(context, user_id):
+    for key in TEST_SESSION_KEYS:
+        context.user_data.pop(key, None)
+    timers = context.bot_data["timers"]
+    timers.cancel((int(user_id), "question"))
+    timers.cancel((int(user_id), "test"))
+
+@timed
+async def show_question(message, context, user_id):
+    question_ids = context.user_data.get("test_question_ids", [])
     current_index = context.user_data.get("current_question", 0)
+    total = test_length(context.user_data)
     
-    if current_index >= len(test_questions):
+    if current_index >= total:
         return
     
-    question = test_questions[current_index]
-    keyboard = []
-    
-    if question.get("type") == "multiple_choice":
-        # سؤال اختيار من متعدد
-        options = question.get("options", [])
-        for i, option in enumerate(options):
-            keyboard.append([InlineKeyboardButton(f"{i+1}. {option}", callback_data=f"answer_{i}")])
-    else:
-        # سؤال صح/خطأ
-        keyboard = [
-            [InlineKeyboardButton("✅ صح", callback_data="answer_1")],
-            [InlineKeyboardButton("❌ خطأ", callback_data="answer_0")]
-        ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    question_text = f"السؤال {current_index + 1}/{len(test_questions)}:\n\n{question['question']}"
-    await query.edit_message_text(question_text, reply_markup=reply_markup)
+    store = await session_store(context)
+    if current_index >= len(question_ids):
+        # الوضع التكيفي: السؤال التالي قريب من مستوى الطالب بعد إجاباته حتى الآن
+        next_question = store.next_adaptive(user_id, question_ids, await student_prior(context, store.class_id, user_id))
+        question_ids.append(next_question["id"])
+    question = store.get(question_ids[current_index])
+    if question is None:
+        question = {"type": "true_false", "question": "⚠️ هذا السؤال لم يعد متاحاً"}
+    
+    # أزرار السؤال من الذاكرة المؤقتة (تُبنى مرة لكل مجموعة خيارات)
+    reply_markup = question_keyboard(question)
+    question_text = f"السؤال {current_index + 1}/{total}:\n\n{question['question']}"
+    if config.QUESTION_TIME_LIMIT:
+        question_text += f"\n\n⏱️ لديك {config.QUESTION_TIME_LIMIT} ثانية"
+    if context.user_data.get("test_deadline"):
+        remaining = max(0, int(context.user_data["test_deadline"] - time.time()))
+        question_text += f"\n⏳ الوقت المتبقي للاختبار: {remaining // 60}:{remaining % 60:02d}"
+    
+    # تذكر الرسالة المعروضة حتى تتمكن المؤقتات من تعديلها لاحقاً
+    message = await show_content(message, question_text, reply_markup, photo_id=question.get("photo_id"),
+                                 has_photo=context.user_data.get("message_photo"))
+    context.user_data["chat_id"] = message.chat_id
+    context.user_data["message_id"] = message.message_id
+    context.user_data["message_photo"] = bool(question.get("photo_id"))
+    
+    if config.QUESTION_TIME_LIMIT:
+        deadline = time.time() + config.QUESTION_TIME_LIMIT
+        context.user_data["question_deadline"] = deadline
+        context.bot_data["timers"].schedule((int(user_id), "question"), deadline, current_index)
 
-async def finish_test(query, context):
+@timed
+async def finish_test(message, context, user_id, name):
     score = context.user_data.get("score", 0)
-    total = len(context.user_data.get("test_questions", []))
-    
-    # حفظ النتائج
-    results = load_results()
-    user_id = str(query.from_user.id)
-    
-    if user_id not in results:
-        results[user_id] = {
-            "name": query.from_user.first_name,
-            "tests": []
-        }
-    
-    results[user_id]["tests"].append({
+    total = test_length(context.user_data)
+    
+    # تصحيح كل إجابة لتحديث إحصاءات الأسئلة
+    store = await session_store(context)
+    graded = []
+    for question_id, answer_index in zip(context.user_data.get("test_question_ids", []), context.user_data.get("answers", [])):
+        question = store.get(question_id)
+        if question is not None:
+            graded.append((question_id, is_correct_answer(question, answer_index)))
+    
+    # حفظ النتائج (صف واحد في جدول النتائج مع تحديث الإحصاءات)
+    user_id = str(user_id)
+    has_photo = context.user_data.get("message_photo")
+    percentage = (score / total) * 100 if total > 0 else 0
+    class_id = context.user_data.get("class_id", DEFAULT_CLASS_ID)
+    # تحميل إحصاءات الفصل قبل الحفظ حتى لا تُحسب النتيجة مرتين
+    stats = await context.bot_data["tenancy"].stats(class_id)
+    db = context.bot_data["db"]
+    await db.run(db.add_result, user_id, name, {
         "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
         "score": score,
         "total": total,
-        "percentage": (score / total) * 100 if total > 0 else 0
-    })
-    
-    save_results(results)
+        "percentage": percentage
+    }, graded, class_id)
+    stats.record(user_id, percentage, graded)
+    COUNTERS["tests_finished"] += 1
+    context.bot_data["page_cache"].invalidate(("view_results", class_id))
+    end_test_session(context, user_id)
     
     # عرض النتيجة
-    percentage = (score / total) * 100 if total > 0 else 0
     result_text = f"🎉 انتهى الاختبار!\n\nنتيجتك: {score}/{total}\nالنسبة: {percentage:.1f}%\n\n"
     
     if percentage >= 80:
@@ -265,42 +317,216 @@ async def finish_test(query, context):
     else:
         result_text += "📚 تحتاج للمزيد من المذاكرة!"
     
-    keyboard = [
-        [InlineKeyboardButton("🏠 الرئيسية", callback_data="back_to_main")],
-        [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")]
-    ]
+    reply_markup = ADMIN_RESULT_MENU if is_admin(context, user_id) else RESULT_MENU
+    await show_content(message, result_text, reply_markup, has_photo=has_photo)
+
+# انتهاء وقت سؤال (يُحسب خطأ وينتقل للتالي) أو وقت الاختبار كله (يُسلَّم تلقائياً)
+@timed
+async def handle_timeout(application, user_id, kind, token):
+    async with application.update_processor.user_lock(user_id):
+        user_data = application.user_data.get(user_id)
+        if not user_data or "test_question_ids" not in user_data:
+            return
+        if kind == "question" and user_data.get("current_question") != token:
+            return
+        if kind == "test" and user_data.get("test_started") != token:
+            return
+        
+        context = CallbackContext(application, chat_id=user_data["chat_id"], user_id=user_id)
+        message = Message(user_data["message_id"], datetime.now(), Chat(user_data["chat_id"], Chat.PRIVATE))
+        message.set_bot(application.bot)
+        
+        COUNTERS[f"{kind}_timeouts"] += 1
+        if kind == "question":
+            user_data["answers"].append(-1)
+            user_data["current_question"] += 1
+        if kind == "question" and user_data["current_question"] < test_length(user_data):
+            await show_question(message, context, user_id)
+        else:
+            await finish_test(message, context, user_id, user_data.get("name"))
+        application.mark_data_for_update_persistence(user_ids=[user_id])
+
+# مهمة واحدة مكررة تعالج كل المواعيد المستحقة في هذه النبضة
+async def timer_tick(context: ContextTypes.DEFAULT_TYPE):
+    for (user_id, kind), token in context.bot_data["timers"].advance(time.time()):
+        context.application.create_task(handle_timeout(context.application, user_id, kind, token))
+
+# إعادة جدولة مواعيد الجلسات المستعادة بعد إعادة التشغيل
+def restore_timers(application):
+    timers = application.bot_data["timers"]
+    for user_id, data in application.user_data.items():
+        if "test_question_ids" not in data:
+            continue
+        if data.get("test_deadline"):
+            timers.schedule((user_id, "test"), data["test_deadline"], data.get("test_started"))
+        if data.get("question_deadline"):
+            timers.schedule((user_id, "question"), data["question_deadline"], data.get("current_question"))
+
+# الاختبار المباشر: المعلم يرسل سؤالاً واحداً لكل الطلاب ويتابع الإجابات لحظياً
+async def live_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = str(query.from_user.id)
+
+    if query.data.startswith("live_answer:"):
+        await live_answer(query, context)
+        return
+
+    await query.answer()
+    if not is_admin(context, user_id):
+        await query.edit_message_text("⛔ هذا الأمر للمعلم فقط!")
+        return
+
+    tenancy = context.bot_data["tenancy"]
+    class_id = tenancy.class_of(user_id)
+    quiz = context.bot_data["live_quizzes"].get(class_id)
+    if query.data == "live_start":
+        if quiz is not None:
+            await query.edit_message_text("⚠️ يوجد اختبار مباشر جارٍ بالفعل.", reply_markup=quiz.teacher_keyboard())
+            return
+        questions = (await tenancy.store(class_id)).sample(LIVE_QUIZ_SIZE)
+        if not questions:
+            await query.edit_message_text("لا توجد أسئلة متاحة للاختبار.")
+            return
+
+        quiz = LiveQuiz(class_id, user_id, questions)
+        quiz.tally_chat_id = query.message.chat_id
+        quiz.tally_message_id = query.message.message_id
+        context.bot_data["live_quizzes"][class_id] = quiz
+        context.job_queue.run_repeating(refresh_live_tally, interval=config.LIVE_TALLY_INTERVAL,
+                                        first=config.LIVE_TALLY_INTERVAL, name=f"live_tally:{class_id}", data=class_id)
+        await next_live_question(context, quiz)
+
+    elif quiz is None:
+        await query.edit_message_text("لا يوجد اختبار مباشر جارٍ.")
+
+    elif query.data == "live_next" and quiz.current + 1 < len(quiz.questions):
+        await next_live_question(context, quiz)
+
+    else:
+        await finish_live_quiz(context, quiz)
+
+# إرسال السؤال التالي لكل الطلاب المسجلين بعدد محدود من الطلبات المتزامنة
+@timed
+async def next_live_question(context, quiz):
+    question = quiz.next_question()
+    quiz.participants = 0
+    await context.bot.edit_message_text(f"⏳ جاري إرسال السؤال {quiz.current + 1}...",
+                                        chat_id=quiz.tally_chat_id, message_id=quiz.tally_message_id)
+
+    text = f"🎯 اختبار مباشر - السؤال {quiz.current + 1}/{len(quiz.questions)}:\n\n{question['question']}"
+    reply_markup = quiz.student_keyboard()
+
+    def send(chat_id):
+        if question.get("photo_id"):
+            return context.bot.send_photo(chat_id, question["photo_id"], caption=text[:1024], reply_markup=reply_markup)
+        return context.bot.send_message(chat_id, text, reply_markup=reply_markup)
+
+    chat_ids = [int(student) for student in context.bot_data["tenancy"].students(quiz.class_id)]
+    delivered = await broadcast(chat_ids, send, config.BROADCAST_CONCURRENCY)
+    quiz.participants = len(delivered)
+    await update_live_tally(context.bot, quiz)
+
+# تسجيل إجابة طالب: زيادة عدّاد الخيار فقط، ولوحة المعلم تُحدَّث بمعدل ثابت
+async def live_answer(query, context):
+    _, class_id, question_index, answer_index = query.data.split(":")[:4]
+    quiz = context.bot_data["live_quizzes"].get(int(class_id))
+    result = None
+    # فقط أعضاء الفصل يُحتسبون
+    if quiz is not None and quiz.question is not None and context.bot_data["tenancy"].role(query.from_user.id, quiz.class_id):
+        correct = is_correct_answer(quiz.question, int(answer_index))
+        result = quiz.answer(query.from_user.id, query.from_user.first_name, int(question_index), int(answer_index), correct)
+
+    if result is None:
+        await query.answer("⌛ هذا السؤال مغلق أو سبق أن أجبت عنه.")
+        return
+    COUNTERS["live_answers"] += 1
+    await query.answer("✅ تم تسجيل إجابتك")
+
+# تحديث لوحة المعلم إذا تغيرت الأعداد منذ آخر تحديث (مهمة مكررة لكل فصل)
+async def refresh_live_tally(context: ContextTypes.DEFAULT_TYPE):
+    quiz = context.bot_data["live_quizzes"].get(context.job.data)
+    if quiz is not None:
+        await update_live_tally(context.bot, quiz)
+
+@timed
+async def update_live_tally(bot, quiz):
+    if quiz.question is None or quiz.version == quiz.rendered_version:
+        return
+    quiz.rendered_version = quiz.version
+    try:
+        await bot.edit_message_text(quiz.render_tally(), chat_id=quiz.tally_chat_id,
+                                            message_id=quiz.tally_message_id, reply_markup=quiz.teacher_keyboard())
+    except BadRequest as exc:
+        if "not modified" not in str(exc).lower():
+            raise
+
+# إنهاء الاختبار المباشر: لوحة الصدارة من العدّادات وحفظ نتيجة كل مشارك
+@timed
+async def finish_live_quiz(context, quiz):
+    context.bot_data["live_quizzes"].pop(quiz.class_id, None)
+    for job in context.job_queue.get_jobs_by_name(f"live_tally:{quiz.class_id}"):
+        job.schedule_removal()
+
+    total = quiz.asked
+    leaderboard = quiz.render_leaderboard()
+    await context.bot.edit_message_text(leaderboard, chat_id=quiz.tally_chat_id, message_id=quiz.tally_message_id,
+                                        reply_markup=HOME_MENU)
+    if not quiz.scores:
+        return
+
+    date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    records = []
+    stats = await context.bot_data["tenancy"].stats(quiz.class_id)
+    for user_id, score in quiz.scores.items():
+        percentage = (score / total) * 100 if total > 0 else 0
+        records.append({"user_id": user_id, "name": quiz.names.get(user_id), "date": date, "score": score,
+                        "total": total, "percentage": percentage, "answers": quiz.answers.get(user_id, []),
+                        "class_id": quiz.class_id})
+        stats.record(user_id, percentage, quiz.answers.get(user_id, []))
+    db = context.bot_data["db"]
+    await db.run(db.add_results, records)
+    context.bot_data["page_cache"].invalidate(("view_results", quiz.class_id))
+
+    def send(chat_id):
+        return context.bot.send_message(chat_id, f"{leaderboard}\nنتيجتك: {quiz.scores[chat_id]}/{total}")
+
+    await broadcast(list(quiz.scores), send, config.BROADCAST_CONCURRENCY)
+
+# حفظ نص السؤال ثم طلب الخيارات أو الإجابة الصحيحة
+async def save_question_text(update, context, text):
+    context.user_data["question_text"] = text
+    question_type = context.user_data.get("question_type")
+    
+    if question_type == "multiple_choice":
+        context.user_data["state"] = STATE_ADD_OPTIONS
+        context.user_data["options"] = []
+        await update.message.reply_text("أرسل الخيار الأول (أرسل 'تم' عند الانتهاء):")
+    else:  # true/false
+        await update.message.reply_text("اختر الإجابة الصحيحة:", reply_markup=CORRECT_ANSWER_MENU)
+
+# سؤال مصوَّر: يرسل المعلم صورة (مع وصف اختياري) ويُحفظ file_id لإعادة استخدامه
+async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        return
     
-    if str(query.from_user.id) == context.bot_data.get("admin_id", ""):
-        keyboard.append([InlineKeyboardButton("📋 إدارة الأسئلة", callback_data="add_question")])
+    if context.user_data.get("state") != STATE_ADD_QUESTION:
+        await update.message.reply_text("لإضافة سؤال مصوَّر اختر أولاً 📝 إضافة سؤال جديد.")
+        return
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(result_text, reply_markup=reply_markup)
+    context.user_data["photo_id"] = update.message.photo[-1].file_id
+    await save_question_text(update, context, update.message.caption or "")
 
 # معالجة الرسائل النصية
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     state = context.user_data.get("state")
     
-    if user_id != context.bot_data.get("admin_id", ""):
+    if not is_admin(context, user_id):
         await update.message.reply_text("أهلاً! استخدم /start لبدء الاختبار.")
         return
     
     if state == STATE_ADD_QUESTION:
-        # حفظ نص السؤال
-        context.user_data["question_text"] = update.message.text
-        question_type = context.user_data.get("question_type")
-        
-        if question_type == "multiple_choice":
-            context.user_data["state"] = STATE_ADD_OPTIONS
-            context.user_data["options"] = []
-            await update.message.reply_text("أرسل الخيار الأول (أرسل 'تم' عند الانتهاء):")
-        else:  # true/false
-            keyboard = [
-                [InlineKeyboardButton("✅ صح", callback_data="set_true")],
-                [InlineKeyboardButton("❌ خطأ", callback_data="set_false")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text("اختر الإجابة الصحيحة:", reply_markup=reply_markup)
+        await save_question_text(update, context, update.message.text)
     
     elif state == STATE_ADD_OPTIONS:
         if update.message.text.lower() == "تم":
@@ -328,17 +554,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             if 0 <= correct_option < len(options):
                 # حفظ السؤال
-                questions = load_questions()
-                
                 new_question = {
                     "type": "multiple_choice",
                     "question": context.user_data.get("question_text", ""),
                     "options": options,
-                    "correct_option": correct_option
+                    "correct_option": correct_option,
+                    "photo_id": context.user_data.get("photo_id")
                 }
                 
-                questions["multiple_choice"].append(new_question)
-                save_questions(questions)
+                await save_question(context, user_id, new_question)
                 
                 # إعادة الضبط
                 context.user_data.clear()
@@ -346,13 +570,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text("✅ تم حفظ السؤال بنجاح!")
                 
                 # العودة للقائمة الرئيسية
-                keyboard = [
-                    [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
-                    [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
-                    [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await update.message.reply_text("اختر من القائمة:", reply_markup=reply_markup)
+                await update.message.reply_text("اختر من القائمة:", reply_markup=QUESTION_SAVED_MENU)
             else:
                 await update.message.reply_text(f"الرجاء إدخال رقم بين 1 و {len(options)}:")
         except ValueError:
@@ -366,16 +584,14 @@ async def set_true_false_answer(update: Update, context: ContextTypes.DEFAULT_TY
     correct_answer = (query.data == "set_true")
     
     # حفظ سؤال صح/خطأ
-    questions = load_questions()
-    
     new_question = {
         "type": "true_false",
         "question": context.user_data.get("question_text", ""),
-        "correct_answer": correct_answer
+        "correct_answer": correct_answer,
+        "photo_id": context.user_data.get("photo_id")
     }
     
-    questions["true_false"].append(new_question)
-    save_questions(questions)
+    await save_question(context, query.from_user.id, new_question)
     
     # إعادة الضبط
     context.user_data.clear()
@@ -383,38 +599,356 @@ async def set_true_false_answer(update: Update, context: ContextTypes.DEFAULT_TY
     await query.edit_message_text(f"✅ تم حفظ السؤال بنجاح! الإجابة الصحيحة: {'صح' if correct_answer else 'خطأ'}")
     
     # العودة للقائمة الرئيسية
-    keyboard = [
-        [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
-        [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
-        [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.message.reply_text("اختر من القائمة:", reply_markup=reply_markup)
+    await query.message.reply_text("اختر من القائمة:", reply_markup=QUESTION_SAVED_MENU)
+
+# استيراد ملف أسئلة (CSV أو JSONL) يرسله المعلم
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        return
+    
+    # أدوات الاستيراد تُحمَّل عند أول استخدام فقط
+    from bulk import detect_format, import_questions
+    
+    document = update.message.document
+    try:
+        fmt = detect_format(document.file_name or "")
+    except ValueError as exc:
+        await update.message.reply_text(f"⚠️ {exc}")
+        return
+    
+    status = await update.message.reply_text("⏳ جاري استيراد الأسئلة...")
+    loop = asyncio.get_running_loop()
+    db = context.bot_data["db"]
+    class_id = context.bot_data["tenancy"].class_of(update.effective_user.id)
+    store = await context.bot_data["tenancy"].store(class_id)
+    
+    # التقدم يُرسل من خيط قاعدة البيانات إلى حلقة الأحداث
+    def progress(report):
+        asyncio.run_coroutine_threadsafe(
+            status.edit_text(f"⏳ تمت معالجة {report.rows} سطر، تم استيراد {report.imported} سؤال..."), loop)
+    
+    def on_batch(saved):
+        loop.call_soon_threadsafe(store.extend, saved)
+    
+    def run_import(path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return import_questions(db, f, fmt, progress=progress, on_batch=on_batch, class_id=class_id)
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "upload")
+            file = await document.get_file()
+            await file.download_to_drive(path)
+            report = await db.run(run_import, path)
+    except Exception:
+        # ما أُدخل من دفعات قبل الخطأ يبقى محفوظاً، فنحدّث الصفحات ونُبلغ المعلم بدل ترك رسالة الانتظار
+        logger.exception("فشل استيراد الملف %s", document.file_name)
+        context.bot_data["page_cache"].invalidate(("view_questions", class_id))
+        await status.edit_text("❌ تعذر إكمال الاستيراد. تحقق من الملف (ترميز UTF-8 وصيغة صحيحة) وحاول مرة أخرى.")
+        return
+    
+    context.bot_data["page_cache"].invalidate(("view_questions", class_id))
+    await update.message.reply_text(f"✅ انتهى الاستيراد\n\n{report.summary()}")
+
+# تصدير بنك الأسئلة كملف: /export أو /export csv
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        await update.message.reply_text("⛔ هذا الأمر للمعلم فقط!")
+        return
+    
+    from bulk import export_questions
+    
+    fmt = "csv" if context.args and context.args[0].lower() == "csv" else "jsonl"
+    db = context.bot_data["db"]
+    class_id = context.bot_data["tenancy"].class_of(update.effective_user.id)
+    
+    def run_export(path):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            return export_questions(db, f, fmt, class_id=class_id)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"questions.{fmt}")
+        count = await db.run(run_export, path)
+        await update.message.reply_document(path, caption=f"📦 {count} سؤال")
+
+# إحصاءات الفصل: عدد الاختبارات، المتوسط، توزيع الدرجات وأصعب الأسئلة
+async def class_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        await update.message.reply_text("⛔ هذا الأمر للمعلم فقط!")
+        return
+    
+    tenancy = context.bot_data["tenancy"]
+    class_id = tenancy.class_of(update.effective_user.id)
+    stats = await tenancy.stats(class_id)
+    if not stats.tests:
+        await update.message.reply_text("لا توجد نتائج بعد.")
+        return
+    
+    text = f"📈 إحصاءات الفصل ({tenancy.classes[class_id]['name']}):\n\nعدد الاختبارات: {stats.tests}\nعدد الطلاب: {len(stats.students)}\nالمتوسط: {stats.mean():.1f}%\n\n📊 توزيع الدرجات:\n"
+    peak = max(stats.histogram) or 1
+    for bucket, count in enumerate(stats.histogram):
+        label = "100%" if bucket == 10 else f"{bucket * 10}-{bucket * 10 + 9}%"
+        text += f"{label}: {'▇' * round(10 * count / peak)} {count}\n"
+    
+    hardest = stats.hardest()
+    if hardest:
+        store = await tenancy.store(class_id)
+        text += "\n🧩 أصعب الأسئلة:\n"
+        for rate, question_id in hardest:
+            question = store.get(question_id)
+            title = question["question"] if question else f"#{question_id}"
+            text += f"- {title}: {rate * 100:.0f}% إجابات صحيحة\n"
+    await update.message.reply_text(text[:4000])
+
+# إحصاءات طالب: /student_stats <معرف الطالب>
+async def student_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        await update.message.reply_text("⛔ هذا الأمر للمعلم فقط!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("الاستخدام: /student_stats <معرف الطالب>")
+        return
+    
+    tenancy = context.bot_data["tenancy"]
+    stats = await tenancy.stats(tenancy.class_of(update.effective_user.id))
+    student = stats.student(context.args[0])
+    if student is None:
+        await update.message.reply_text("لا توجد نتائج لهذا الطالب.")
+        return
+    await update.message.reply_text(
+        f"👤 الطالب {context.args[0]}:\n\nعدد الاختبارات: {student['tests']}\n"
+        f"المتوسط: {student['mean']:.1f}%\nأفضل نتيجة: {student['best']:.1f}%")
+
+# أكثر العمليات استهلاكاً للوقت (العدد × المتوسط) في قسم من تقرير /stats
+def format_latency(title, stats_by_name, limit=8):
+    top = sorted(stats_by_name.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+    if not top:
+        return ""
+    text = f"\n{title}\n"
+    for name, stats in top:
+        snapshot = stats.snapshot()
+        text += f"- {name}: {snapshot['count']} × {snapshot['mean_ms']}ms (أقصى {snapshot['max_ms']}ms)\n"
+    return text
+
+# أداء البوت منذ التشغيل: /stats (لمدير البوت)
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) not in context.bot_data["admin_ids"]:
+        await update.message.reply_text("⛔ هذا الأمر لمدير البوت فقط!")
+        return
+    
+    application = context.application
+    processor = application.update_processor
+    db = context.bot_data["db"]
+    text = (f"⚙️ أداء البوت:\n\nجلسات اختبار جارية: {active_sessions(application)}\n"
+            f"تحديثات منتظرة: {getattr(processor, 'pending', application.update_queue.qsize())}\n"
+            f"اختبارات بدأت/انتهت: {COUNTERS['tests_started']}/{COUNTERS['tests_finished']}\n"
+            f"انتظار التخزين: خيط {db.queue_wait.snapshot()['mean_ms']}ms، "
+            f"قفل الكتابة {db.write_wait.snapshot()['mean_ms']}ms\n")
+    text += format_latency("⏱️ المعالجات:", getattr(processor, "latency", {}))
+    text += format_latency("💾 التخزين:", db.latency)
+    limiter = application.bot.rate_limiter
+    if hasattr(limiter, "latency"):
+        text += format_latency("📡 Bot API:", limiter.latency)
+        text += format_latency("🚦 انتظار حد المعدل:", limiter.throttled)
+    await update.message.reply_text(text[:4000])
+
+# الانضمام إلى فصل برمز يعطيه المعلم: /join <الرمز>
+async def join_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    tenancy = context.bot_data["tenancy"]
+    if not context.args:
+        await update.message.reply_text("الاستخدام: /join <رمز الفصل>")
+        return
+    
+    class_id = tenancy.class_by_code(context.args[0])
+    if class_id is None and config.WORKER_COUNT > 1:
+        # ربما أُنشئ الفصل في عامل آخر
+        await tenancy.reload()
+        class_id = tenancy.class_by_code(context.args[0])
+    if class_id is None:
+        await update.message.reply_text("⚠️ رمز الفصل غير صحيح.")
+        return
+    
+    if tenancy.role(user.id, class_id):
+        await tenancy.switch(user.id, class_id)
+    else:
+        await tenancy.join(user.id, user.first_name, class_id)
+    await update.message.reply_text(f"✅ أنت الآن في فصل {tenancy.classes[class_id]['name']}. استخدم /start للبدء.")
+
+# عرض فصول المستخدم أو الانتقال إلى أحدها: /class [رقم الفصل]
+async def class_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    tenancy = context.bot_data["tenancy"]
+    memberships = tenancy.classes_of(user.id)
+    
+    if context.args:
+        class_id = int(context.args[0]) if context.args[0].isdigit() else None
+        if class_id not in memberships:
+            await update.message.reply_text("⚠️ لست عضواً في هذا الفصل.")
+            return
+        await tenancy.switch(user.id, class_id)
+    
+    current = tenancy.class_of(user.id)
+    text = "🏫 فصولك:\n\n"
+    for class_id, role in memberships.items():
+        class_info = tenancy.classes[class_id]
+        line = f"{'👉' if class_id == current else '▫️'} {class_id}. {class_info['name']}"
+        if role == ROLE_ADMIN:
+            line += f" (معلم، رمز الانضمام: {class_info['join_code']})"
+        text += line + "\n"
+    if not memberships:
+        text += "لم تنضم لأي فصل بعد. استخدم /join <رمز الفصل>\n"
+    text += "\nللانتقال: /class <رقم الفصل>"
+    await update.message.reply_text(text)
+
+# إنشاء فصل جديد (لمعلمي الإعدادات فقط): /newclass <الاسم>
+async def new_class_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if str(user.id) not in context.bot_data["admin_ids"]:
+        await update.message.reply_text("⛔ هذا الأمر لمدير البوت فقط!")
+        return
+    
+    name = " ".join(context.args).strip()
+    if not name:
+        await update.message.reply_text("الاستخدام: /newclass <اسم الفصل>")
+        return
+    
+    tenancy = context.bot_data["tenancy"]
+    class_info = await tenancy.create_class(name)
+    await tenancy.join(user.id, user.first_name, class_info["id"], ROLE_ADMIN)
+    await update.message.reply_text(
+        f"✅ تم إنشاء فصل {name} (رقم {class_info['id']}).\n"
+        f"رمز انضمام الطلاب: {class_info['join_code']}\nيرسل الطالب: /join {class_info['join_code']}")
+
+# إضافة معلم آخر للفصل الحالي: /add_admin <معرف المستخدم>
+async def add_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(context, update.effective_user.id):
+        await update.message.reply_text("⛔ هذا الأمر للمعلم فقط!")
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("الاستخدام: /add_admin <معرف المستخدم>")
+        return
+    
+    tenancy = context.bot_data["tenancy"]
+    class_id = tenancy.class_of(update.effective_user.id)
+    await tenancy.join(context.args[0], None, class_id, ROLE_ADMIN)
+    await update.message.reply_text(f"✅ أصبح المستخدم {context.args[0]} معلماً في فصل {tenancy.classes[class_id]['name']}.")
 
 async def start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user = query.from_user
     
-    keyboard = []
-    
-    if str(user.id) == context.bot_data.get("admin_id", ""):
-        keyboard = [
-            [InlineKeyboardButton("📝 إضافة سؤال جديد", callback_data="add_question")],
-            [InlineKeyboardButton("📋 عرض الأسئلة", callback_data="view_questions")],
-            [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
-            [InlineKeyboardButton("📊 عرض النتائج", callback_data="view_results")]
-        ]
+    if is_admin(context, user.id):
+        reply_markup = ADMIN_MENU
         message = f"مرحباً أستاذ {user.first_name}! اختر من القائمة:"
     else:
-        keyboard = [
-            [InlineKeyboardButton("🧪 بدء الاختبار", callback_data="start_test")],
-            [InlineKeyboardButton("📊 نتائجي السابقة", callback_data="my_results")]
-        ]
+        reply_markup = STUDENT_MENU
         message = f"مرحباً {user.first_name}! اختر من القائمة:"
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(message, reply_markup=reply_markup)
 
+# تهيئة مخطط قاعدة البيانات وترحيل ملفات JSON القديمة (متزامنة)
+# مع عدة عمال يستدعيها cluster.py مرة واحدة قبل تشغيلهم، فلا يتسابق العمال على الترحيل
+def prepare_storage(db):
+    db.init()
+    migrate_legacy_files(db, QUESTIONS_FILE, RESULTS_FILE, LEGACY_RESULTS_FILE)
+
+# تهيئة قاعدة البيانات (لعملية واحدة) ثم تحميل الفصول والأدوار
+# (أسئلة وإحصاءات كل فصل تُحمَّل عند أول استخدام، والفصل الافتراضي يبدأ تحميله في الخلفية)
+async def post_init(application: Application):
+    db = application.bot_data["db"]
+    if config.WORKER_COUNT == 1:
+        await db.run(prepare_storage, db)
+    await application.bot_data["tenancy"].load(application.bot_data["admin_ids"])
+    restore_timers(application)
+    # تحميل بنك الفصل الافتراضي في الخلفية: البوت جاهز فوراً وأول اختبار لا ينتظر التحميل غالباً
+    application.bot_data["tenancy"].preload(DEFAULT_CLASS_ID)
+    if config.METRICS_PORT and config.BOT_MODE != "webhook":
+        from webhook import start_metrics_server
+        application.bot_data["metrics_server"] = await start_metrics_server(application, config.WEBHOOK_HOST,
+                                                                            config.METRICS_PORT)
+
+# حذف جلسات الاختبار المتروكة من الذاكرة ومن قاعدة البيانات
+async def expire_sessions(context: ContextTypes.DEFAULT_TYPE):
+    cutoff = time.time() - SESSION_TTL
+    expired = [user_id for user_id, data in context.application.user_data.items()
+               if data.get("last_activity", cutoff) < cutoff]
+    for user_id in expired:
+        context.application.drop_user_data(user_id)
+    if expired:
+        logger.info("تم حذف %d جلسة متروكة", len(expired))
+
+# مع عدة عمال: قراءة ما كتبه العمال الآخرون (أسئلة، أدوار، نتائج)
+async def refresh_shared_state(context: ContextTypes.DEFAULT_TYPE):
+    await context.bot_data["tenancy"].refresh()
+    context.bot_data["page_cache"].clear()
+
+# إغلاق اتصالات قاعدة البيانات عند الإيقاف
+async def post_shutdown(application: Application):
+    if "metrics_server" in application.bot_data:
+        await application.bot_data.pop("metrics_server").cleanup()
+    await asyncio.to_thread(application.bot_data["db"].close)
+
+# بناء التطبيق مع معالجاته (يُستخدم أيضاً في أدوات القياس)
+# request: طبقة HTTP بديلة (مثل Bot API وهمي في الذاكرة)، وrate_limit=False لقياس زمن المعالجات وحده
+def build_application(token, admin_id, database_file=DATABASE_FILE, base_url=config.TELEGRAM_API_BASE_URL,
+                      request=None, rate_limit=True):
+    # إنشاء تطبيق البوت (عمال cluster.py يجدون المخطط مهيأً)
+    db = Database(database_file, initialized=config.WORKER_COUNT > 1)
+    builder = Application.builder().token(token).post_init(post_init).post_shutdown(post_shutdown)
+    shard = (config.WORKER_INDEX, config.WORKER_COUNT) if config.WORKER_COUNT > 1 else None
+    builder = builder.persistence(SQLitePersistence(db, update_interval=SESSION_FLUSH_INTERVAL, session_ttl=SESSION_TTL,
+                                                    shard=shard))
+    if rate_limit and config.TELEGRAM_RATE_LIMIT > 0:
+        builder = builder.rate_limiter(TelegramRateLimiter(overall_rate=config.TELEGRAM_RATE_LIMIT / config.WORKER_COUNT))
+    builder = builder.concurrent_updates(PerUserUpdateProcessor(config.CONCURRENT_UPDATES, config.MAX_PENDING_UPDATES))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
+    
+    # معلمو الإعدادات: يديرون الفصل الافتراضي ويمكنهم إنشاء فصول جديدة
+    application.bot_data["admin_ids"] = {str(i).strip() for i in [admin_id, *config.ADMIN_IDS] if str(i).strip()}
+    
+    # محرك التخزين وبنك الأسئلة في الذاكرة (يُحمَّل في post_init)
+    application.bot_data["db"] = db
+    application.bot_data["tenancy"] = Tenancy(db, recent_window=RECENT_QUESTIONS_WINDOW)
+    application.bot_data["page_cache"] = PageCache()
+    application.bot_data["timers"] = TimerWheel(config.TIMER_TICK)
+    application.bot_data["live_quizzes"] = {}
+    
+    # إضافة معالجات الأوامر
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CallbackQueryHandler(set_true_false_answer, pattern="^(set_true|set_false)$"))
+    application.add_handler(CallbackQueryHandler(live_handler, pattern="^live_"))
+    application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("class_stats", class_stats_command))
+    application.add_handler(CommandHandler("student_stats", student_stats_command))
+    application.add_handler(CommandHandler("join", join_command))
+    application.add_handler(CommandHandler("class", class_command))
+    application.add_handler(CommandHandler("newclass", new_class_command))
+    application.add_handler(CommandHandler("add_admin", add_admin_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    # أسماء الأوامر المسجلة فقط تظهر في مقاييس المعالجات
+    application.update_processor.commands = frozenset(
+        command for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, CommandHandler) for command in handler.commands)
+    application.job_queue.run_repeating(expire_sessions, interval=3600, first=60)
+    if config.QUESTION_TIME_LIMIT or config.TEST_TIME_LIMIT:
+        application.job_queue.run_repeating(timer_tick, interval=config.TIMER_TICK, first=config.TIMER_TICK)
+    if config.WORKER_COUNT > 1:
+        application.job_queue.run_repeating(refresh_shared_state, interval=config.SHARED_STATE_REFRESH,
+                                            first=config.SHARED_STATE_REFRESH)
+    
+    return application
+
 def main():
     # الحصول على التوكن من متغير البيئة أو المدخلات
     TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -432,24 +966,27 @@ def main():
         print("يرجى تعيين متغير البيئة TELEGRAM_ADMIN_ID أو إدخال المعرف:")
         ADMIN_ID = input("أدخل معرف التليجرام للمعلم: ").strip()
     
-    # إنشاء تطبيق البوت
-    application = Application.builder().token(TOKEN).build()
+    # خادم webhook بلا رمز سري يقبل تحديثات من أي أحد، فلا يُشغَّل إلا على واجهة محلية
+    if config.BOT_MODE == "webhook" and not config.WEBHOOK_URL and not config.WEBHOOK_SECRET:
+        from webhook import is_loopback
+        if not is_loopback(config.WEBHOOK_HOST):
+            print(f"⚠️  يجب تعيين WEBHOOK_SECRET للاستماع على {config.WEBHOOK_HOST} (أو WEBHOOK_HOST=127.0.0.1)")
+            return
     
-    # حفظ معرف المعلم
-    application.bot_data["admin_id"] = ADMIN_ID
-    
-    # إضافة معالجات الأوامر
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CallbackQueryHandler(button_handler))
-    application.add_handler(CallbackQueryHandler(set_true_false_answer, pattern="^(set_true|set_false)$"))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application = build_application(TOKEN, ADMIN_ID)
     
     print("🤖 البوت يعمل الآن...")
     print(f"👨‍🏫 معرف المعلم: {ADMIN_ID}")
     print("اضغط Ctrl+C لإيقاف البوت")
     
     # تشغيل البوت
-    application.run_polling()
+    if config.BOT_MODE == "webhook":
+        # aiohttp يُستورد فقط في وضع webhook (أسرع إقلاعاً في وضع polling)
+        from webhook import run_webhook
+        asyncio.run(run_webhook(application, config.WEBHOOK_HOST, config.PORT, config.WEBHOOK_PATH,
+                                url=config.WEBHOOK_URL, secret_token=config.WEBHOOK_SECRET))
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
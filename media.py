@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+
+from telegram import InputMediaPhoto
+
+CAPTION_LIMIT = 1024
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# عرض نص أو صورة في رسالة الاختبار: تعديل الرسالة نفسها عند الإمكان.
+# تُرجع الرسالة التي تعرض المحتوى الآن (قد تكون رسالة جديدة)
+async def show_content(message, text, reply_markup=None, photo_id=None, has_photo=None):
+    if has_photo is None:
+        has_photo = bool(message.photo)
+    if photo_id:
+        if has_photo:
+            await message.edit_media(InputMediaPhoto(photo_id, caption=text[:CAPTION_LIMIT]), reply_markup=reply_markup)
+            return message
+        # لا يمكن تحويل رسالة نصية إلى صورة: نرسل رسالة جديدة ونحذف القديمة
+        new_message = await message.reply_photo(photo_id, caption=text[:CAPTION_LIMIT], reply_markup=reply_markup)
+        await message.delete()
+        return new_message
+    if has_photo:
+        new_message = await message.reply_text(text, reply_markup=reply_markup)
+        await message.delete()
+        return new_message
+    await message.edit_text(text, reply_markup=reply_markup)
+    return message
+
+# رفع صورة مرة واحدة والحصول على file_id لإعادة استخدامه
+async def upload_photo(bot, chat_id, path):
+    with open(path, 'rb') as f:
+        message = await bot.send_photo(chat_id, f)
+    return message.photo[-1].file_id
+
+# تحويل مسار صورة محلية إلى file_id، مع ذاكرة دائمة حسب بصمة المحتوى
+# (تُستدعى من خيط الاستيراد؛ الرفع يتم في حلقة الأحداث الممرَّرة)
+class ImageResolver:
+    def __init__(self, db, bot, chat_id, loop):
+        self.db = db
+        self.bot = bot
+        self.chat_id = chat_id
+        self.loop = loop
+        self.uploaded = 0
+        self.reused = 0
+
+    def _wait(self, coroutine):
+        if self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+        return self.loop.run_until_complete(coroutine)
+
+    def __call__(self, path):
+        content_hash = file_hash(path)
+        file_id = self.db.get_media_file_id(content_hash)
+        if file_id:
+            self.reused += 1
+            return file_id
+        file_id = self._wait(upload_photo(self.bot, self.chat_id, path))
+        self.db.save_media_file_id(content_hash, file_id)
+        self.uploaded += 1
+        return file_id
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import time
+from collections import Counter, defaultdict
+
+# إحصاءات زمن التنفيذ: عدد، مجموع، وأقصى قيمة (تحديث O(1) دون تخزين العينات)
+class LatencyStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self):
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "mean_ms": round(mean * 1000, 3), "max_ms": round(self.max * 1000, 3)}
+
+# أزمنة الدوال المزيَّنة بـ timed وعدّادات الأحداث، على مستوى العملية
+TIMINGS = defaultdict(LatencyStats)
+COUNTERS = Counter()
+
+# قياس زمن دالة (متزامنة أو غير متزامنة) باسمها في TIMINGS
+def timed(fn):
+    stats = TIMINGS[fn.__name__]
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                stats.observe(time.perf_counter() - start)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.observe(time.perf_counter() - start)
+    return wrapper
+
+# عدد جلسات الاختبار الجارية في ذاكرة التطبيق
+def active_sessions(application):
+    return sum(1 for data in application.user_data.values() if "test_question_ids" in data)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# عائلة مقاييس زمن بصيغة Prometheus: summary (count/sum) ومقياس للقيمة القصوى
+def _latency_family(lines, name, help_text, label, stats_by_label):
+    lines.append(f"# HELP {name}_seconds {help_text}")
+    lines.append(f"# TYPE {name}_seconds summary")
+    for key, stats in sorted(stats_by_label.items()):
+        lines.append(f'{name}_seconds_count{{{label}="{_label(key)}"}} {stats.count}')
+        lines.append(f'{name}_seconds_sum{{{label}="{_label(key)}"}} {stats.total:.6f}')
+    lines.append(f"# TYPE {name}_seconds_max gauge")
+    for key, stats in sorted(stats_by_label.items()):
+        lines.append(f'{name}_seconds_max{{{label}="{_label(key)}"}} {stats.max:.6f}')
+
+def _gauge(lines, name, help_text, value, kind="gauge"):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.append(f"{name} {value}")
+
+# كل مقاييس التطبيق بصيغة نص Prometheus (المكوّنات غير الموجودة تُتجاوز)
+def render_prometheus(application):
+    lines = []
+    _gauge(lines, "quiz_bot_active_sessions", "جلسات اختبار جارية", active_sessions(application))
+    _gauge(lines, "quiz_bot_update_queue", "تحديثات في طابور التطبيق", application.update_queue.qsize())
+    _gauge(lines, "quiz_bot_live_quizzes", "اختبارات مباشرة جارية", len(application.bot_data.get("live_quizzes", {})))
+
+    processor = application.update_processor
+    if hasattr(processor, "latency"):
+        _gauge(lines, "quiz_bot_updates_pending", "تحديثات مقبولة لم تنته", processor.pending)
+        _gauge(lines, "quiz_bot_updates_running", "تحديثات قيد التنفيذ", processor.running)
+        _latency_family(lines, "quiz_bot_handler", "زمن معالجة التحديث حسب المعالج", "handler", processor.latency)
+
+    db = application.bot_data.get("db")
+    if db is not None:
+        _latency_family(lines, "quiz_bot_storage", "زمن عمليات التخزين حسب العملية", "operation", db.latency)
+        _latency_family(lines, "quiz_bot_storage_queue", "انتظار خيط التخزين أو قفل الكتابة", "stage",
+                        {"executor": db.queue_wait, "write_lock": db.write_wait})
+
+    limiter = getattr(application.bot, "rate_limiter", None)
+    if hasattr(limiter, "latency"):
+        _latency_family(lines, "quiz_bot_telegram", "زمن طلبات Bot API حسب الطريقة", "method", limiter.latency)
+        _latency_family(lines, "quiz_bot_telegram_throttle", "الانتظار في محدد المعدل", "method", limiter.throttled)
+        _gauge(lines, "quiz_bot_telegram_retries_total", "إعادة المحاولة بعد 429", limiter.retries, "counter")
+        _gauge(lines, "quiz_bot_telegram_dropped_edits_total", "تعديلات أُسقطت لوجود أحدث", limiter.dropped_edits,
+               "counter")
+
+    if TIMINGS:
+        _latency_family(lines, "quiz_bot_function", "زمن الدوال الداخلية", "function", TIMINGS)
+    for name, value in sorted(COUNTERS.items()):
+        _gauge(lines, f"quiz_bot_{name}_total", name.replace("_", " "), value, "counter")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# حفظ بيانات المستخدمين (جلسات الاختبار الجارية) في جدول sessions بقاعدة البيانات.
+# مع عدة عمال (shard) يقرأ كل عامل ويكتب جلسات مستخدميه فقط
+class SQLitePersistence(BasePersistence):
+    def __init__(self, db, update_interval=10, session_ttl=24 * 3600, shard=None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        self.session_ttl = session_ttl
+        self.shard = shard
+        self._staged = {}
+        self._flush_task = None
+        # الكتابات تُنفَّذ بالتتابع بترتيب أخذ النسخ: القفل FIFO، فلا تطغى نسخة أقدم على أحدث
+        self._write_lock = asyncio.Lock()
+
+    async def get_user_data(self):
+        await self.db.run(self.db.init)
+        cutoff = time.time() - self.session_ttl
+        rows = await self.db.run(self.db.load_sessions, cutoff, self.shard)
+        logger.info("تم استرجاع %d جلسة", len(rows))
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    # تُجمع التغييرات وتُكتب كلها في معاملة واحدة بعد انتهاء دورة التحديث
+    def _owns(self, user_id):
+        return self.shard is None or user_id % self.shard[1] == self.shard[0]
+
+    async def update_user_data(self, user_id, data):
+        if not self._owns(user_id):
+            return
+        self._staged[user_id] = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        if not self._owns(user_id):
+            return
+        self._staged[user_id] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._write_staged())
+
+    async def _write_staged(self):
+        await asyncio.sleep(0)
+        staged, self._staged = self._staged, {}
+        self._flush_task = None
+        if staged:
+            # أخذ النسخة وطلب القفل دون انتظار بينهما، فترتيب الكتابة هو ترتيب النسخ
+            async with self._write_lock:
+                await self.db.run(self.db.save_sessions, staged, time.time())
+
+    async def flush(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_staged()
+        # انتظار كتابات جارية بدأت قبل الاستدعاء
+        async with self._write_lock:
+            pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        pass
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+EDIT_ENDPOINTS = {"editMessageText", "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup"}
+# طلبات لا تخضع لحد المحادثة الواحدة
+CHAT_EXEMPT_ENDPOINTS = {"answerCallbackQuery", "getMe", "getUpdates", "setWebhook", "deleteWebhook", "getFile"}
+# الرد على ضغطات الأزرار لا يُحسب ضمن حد الإرسال العام (مهم عند إجابة فصل كامل في وقت واحد)
+OVERALL_EXEMPT_ENDPOINTS = {"answerCallbackQuery"}
+
+# دلو رموز: rate رمز في الثانية بسعة capacity، مع إمكانية الإيقاف المؤقت بعد 429
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    # حجز رمز وإرجاع مدة الانتظار اللازمة قبل استخدامه
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+# محدد معدل الطلبات الصادرة: دلو عام ودلو لكل محادثة، إعادة المحاولة بعد 429،
+# وإسقاط تعديلات الرسالة التي حلّ محلها تعديل أحدث أثناء الانتظار
+class TelegramRateLimiter(BaseRateLimiter):
+    def __init__(self, overall_rate=30, chat_rate=1, chat_burst=4, max_retries=3):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._overall = TokenBucket(overall_rate, overall_rate)
+        self._chats = {}
+        self._edit_generations = {}
+        self.retries = 0
+        self.dropped_edits = 0
+        # زمن الطلب نفسه والانتظار في الدلاء، حسب الطريقة
+        self.latency = defaultdict(LatencyStats)
+        self.throttled = defaultdict(LatencyStats)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+        self._edit_generations.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # المحادثات الخاملة تعود لسعتها الكاملة، فلا داعي للاحتفاظ بها
+            if len(self._chats) > 10000:
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items()
+                               if b.tokens < b.capacity - (now - b.updated) * b.rate or b.paused_until > now}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_bucket, overall=True):
+        wait = chat_bucket.reserve() if chat_bucket else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+        wait = self._overall.reserve() if overall else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        chat_bucket = None
+        if chat_id is not None and endpoint not in CHAT_EXEMPT_ENDPOINTS:
+            chat_bucket = self._chat_bucket(chat_id)
+
+        edit_key = None
+        if endpoint in EDIT_ENDPOINTS and data.get("message_id") is not None:
+            edit_key = (chat_id, data["message_id"])
+            generation = self._edit_generations.get(edit_key, 0) + 1
+            self._edit_generations[edit_key] = generation
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                await self._acquire(chat_bucket, endpoint not in OVERALL_EXEMPT_ENDPOINTS)
+                sent = time.perf_counter()
+                self.throttled[endpoint].observe(sent - start)
+                if edit_key and self._edit_generations.get(edit_key) != generation:
+                    # وصل تعديل أحدث للرسالة نفسها: لا فائدة من إرسال هذا
+                    self.dropped_edits += 1
+                    return True
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as exc:
+                    if attempt == self.max_retries:
+                        raise
+                    self.retries += 1
+                    logger.warning("429 من تليجرام (%s)، إعادة المحاولة بعد %s ثانية", endpoint, exc.retry_after)
+                    (chat_bucket or self._overall).pause(exc.retry_after)
+                finally:
+                    self.latency[endpoint].observe(time.perf_counter() - sent)
+        finally:
+            if edit_key and self._edit_generations.get(edit_key) == generation:
+                del self._edit_generations[edit_key]
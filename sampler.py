@@ -0,0 +1,193 @@
+import math
+import random
+from collections import deque
+
+# مجموعة معرّفات تدعم الإضافة والحذف والسحب العشوائي في O(1)
+class IdPool:
+    def __init__(self):
+        self.ids = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id):
+        return question_id in self._positions
+
+    def add(self, question_id):
+        if question_id in self._positions:
+            return
+        self._positions[question_id] = len(self.ids)
+        self.ids.append(question_id)
+
+    def remove(self, question_id):
+        position = self._positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if position < len(self.ids):
+            self.ids[position] = last
+            self._positions[last] = position
+
+    def choice(self, rng):
+        return self.ids[rng.randrange(len(self.ids))]
+
+# فهرس معرّفات الأسئلة في الذاكرة حسب النوع والتصنيف
+class QuestionSampler:
+    def __init__(self, recent_window=20, rng=None):
+        self.recent_window = recent_window
+        self._rng = rng or random.Random()
+        self._pools = {}
+        self._recent = {}
+
+    @staticmethod
+    def _pool_keys(question):
+        q_type = question.get("type")
+        category = question.get("category")
+        return [(None, None), (q_type, None), (None, category), (q_type, category)]
+
+    def add(self, question):
+        for key in self._pool_keys(question):
+            self._pools.setdefault(key, IdPool()).add(question["id"])
+
+    # سحب k معرّفات مختلفة في O(k) مع تجنب ما استُبعد قدر الإمكان
+    def sample(self, k, q_type=None, category=None, exclude=()):
+        pool = self._pools.get((q_type, category))
+        if not pool:
+            return []
+        k = min(k, len(pool))
+        if k * 2 >= len(pool):
+            # المجموعة صغيرة: السحب المباشر أرخص من المحاولة والرفض
+            candidates = [i for i in pool.ids if i not in exclude]
+            if len(candidates) >= k:
+                return self._rng.sample(candidates, k)
+            rest = [i for i in pool.ids if i in exclude]
+            return candidates + self._rng.sample(rest, k - len(candidates))
+
+        chosen = []
+        seen = set()
+        skipped = []
+        attempts = 4 * k + len(exclude)
+        while len(chosen) < k and attempts > 0:
+            attempts -= 1
+            question_id = pool.choice(self._rng)
+            if question_id in seen:
+                continue
+            seen.add(question_id)
+            if question_id in exclude:
+                skipped.append(question_id)
+                continue
+            chosen.append(question_id)
+        # لا توجد أسئلة جديدة كافية: السماح بتكرار الأسئلة التي رآها الطالب
+        while len(chosen) < k and skipped:
+            chosen.append(skipped.pop())
+        while len(chosen) < k:
+            question_id = pool.choice(self._rng)
+            if question_id not in seen:
+                seen.add(question_id)
+                chosen.append(question_id)
+        return chosen
+
+    # الأسئلة التي رآها الطالب مؤخراً
+    def recent(self, user_id):
+        history = self._recent.get(str(user_id))
+        return set(history) if history else set()
+
+    def remember(self, user_id, question_ids):
+        history = self._recent.setdefault(str(user_id), deque(maxlen=self.recent_window))
+        history.extend(question_ids)
+
+# المستوى المقابل لنسبة إجابات صحيحة (لوغاريتم النسبة، مع تقييد الحالات القصوى)
+def rating_from_rate(rate):
+    rate = min(max(rate, 0.02), 0.98)
+    return math.log(rate / (1 - rate))
+
+# احتمال الإجابة الصحيحة في نموذج Elo: الفرق بين مستوى الطالب وصعوبة السؤال
+def expected_correct(ability, difficulty):
+    return 1 / (1 + math.exp(difficulty - ability))
+
+# فهرس صعوبة الأسئلة: تقدير لكل سؤال يُحدَّث مع كل إجابة (Elo)، والأسئلة في دلاء حسب الصعوبة
+# (نقل سؤال بين دلوين O(1)، والاختيار يبحث في دلاء حول المستوى المطلوب فقط، مهما كبر البنك)
+class DifficultyIndex:
+    MIN_RATING = -4.0
+    MAX_RATING = 4.0
+    BUCKET_WIDTH = 0.25
+    STUDENT_K = 0.4
+    QUESTION_K = 0.4
+
+    def __init__(self, target=0.7, rng=None):
+        # نختار أسئلة يجيبها الطالب صحيحاً باحتمال target تقريباً
+        self.target_offset = rating_from_rate(target)
+        self._rng = rng or random.Random()
+        self._buckets = [IdPool() for _ in range(self._bucket(self.MAX_RATING) + 1)]
+        self._ratings = {}
+        self._attempts = {}
+        self._bucket_of = {}
+        self.abilities = {}
+
+    def _bucket(self, rating):
+        rating = min(max(rating, self.MIN_RATING), self.MAX_RATING)
+        return int((rating - self.MIN_RATING) / self.BUCKET_WIDTH)
+
+    def __len__(self):
+        return len(self._ratings)
+
+    # إضافة سؤال بصعوبة أولية من إحصاءاته المحفوظة (المحاولات والإجابات الصحيحة)
+    def add(self, question_id, attempts=0, correct=0):
+        self._attempts[question_id] = attempts
+        self._place(question_id, -rating_from_rate((correct + 1) / (attempts + 2)))
+
+    def _place(self, question_id, rating):
+        self._ratings[question_id] = rating
+        bucket = self._bucket(rating)
+        old = self._bucket_of.get(question_id)
+        if old == bucket:
+            return
+        if old is not None:
+            self._buckets[old].remove(question_id)
+        self._buckets[bucket].add(question_id)
+        self._bucket_of[question_id] = bucket
+
+    def difficulty(self, question_id):
+        return self._ratings.get(question_id)
+
+    def ability(self, user_id, prior=0.0):
+        return self.abilities.get(str(user_id), prior)
+
+    # تحديث مستوى الطالب وصعوبة السؤال بعد إجابة واحدة
+    def record(self, user_id, question_id, correct, prior=0.0):
+        rating = self._ratings.get(question_id)
+        if rating is None:
+            return
+        ability = self.ability(user_id, prior)
+        surprise = (1 if correct else 0) - expected_correct(ability, rating)
+        self.abilities[str(user_id)] = ability + self.STUDENT_K * surprise
+        # صعوبة السؤال تستقر مع تزايد محاولاته
+        attempts = self._attempts[question_id] = self._attempts[question_id] + 1
+        self._place(question_id, rating - self.QUESTION_K * surprise / (1 + attempts / 20))
+
+    # سؤال قريب من مستوى الطالب: الدلو المناسب ثم الدلاء المجاورة.
+    # exclude لا يُختار أبداً (أسئلة الاختبار الحالي)، وavoid يُتجنب قدر الإمكان (ما رآه الطالب مؤخراً)
+    def choose(self, user_id, exclude=(), avoid=(), prior=0.0):
+        center = self._bucket(self.ability(user_id, prior) - self.target_offset)
+        fallback = None
+        for distance in range(len(self._buckets)):
+            for bucket in ((center - distance, center + distance) if distance else (center,)):
+                if not 0 <= bucket < len(self._buckets) or not self._buckets[bucket]:
+                    continue
+                question_id = self._pick(self._buckets[bucket], exclude, avoid)
+                if question_id is not None:
+                    return question_id
+                if fallback is None:
+                    fallback = self._pick(self._buckets[bucket], exclude)
+        return fallback
+
+    # سحب عشوائي من الدلو خارج exclude وavoid؛ المسح الكامل فقط إذا غلب المستبعد على الدلو
+    def _pick(self, pool, exclude, avoid=()):
+        if len(pool) > 8 + len(exclude) + len(avoid):
+            for _ in range(8):
+                question_id = pool.choice(self._rng)
+                if question_id not in exclude and question_id not in avoid:
+                    return question_id
+        candidates = [i for i in pool.ids if i not in exclude and i not in avoid]
+        return self._rng.choice(candidates) if candidates else None
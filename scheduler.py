@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import re
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import LatencyStats
+
+# حد أسماء المعالجات في مقاييس الزمن: ما يزيد عنه يُحسب تحت "other"
+MAX_HANDLER_LABELS = 100
+
+# اسم المعالج لأغراض القياس: answer_3 -> answer و view_results:2 -> view_results
+# و live_answer:7:3:2:1 -> live_answer (ما بعد أول ":" معاملات، فيبقى عدد الأسماء ثابتاً).
+# الأوامر خارج commands (الأوامر المسجلة) تُحسب كلها تحت command_other: النص يكتبه المستخدم
+def update_kind(update, commands=frozenset()):
+    if not isinstance(update, Update):
+        return type(update).__name__
+    if update.callback_query and update.callback_query.data:
+        return re.sub(r"_\d+$", "", update.callback_query.data.split(":", 1)[0])
+    if update.message and update.message.text and update.message.text.startswith("/"):
+        command = update.message.text.split()[0][1:].split("@")[0].lower()
+        return command if command in commands else "command_other"
+    if update.message:
+        return "message"
+    return "other"
+
+def update_key(update):
+    if isinstance(update, Update):
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+    return None
+
+# معالجة تحديثات المستخدمين المختلفين بالتوازي، وتحديثات المستخدم الواحد بالترتيب
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=64, max_pending_updates=1000):
+        # سيمافور المكتبة يحدّ عدد التحديثات المقبولة (الطابور)، وسيمافورنا يحدّ التنفيذ الفعلي
+        super().__init__(max_pending_updates)
+        self.max_workers = max_concurrent_updates
+        self.max_pending_updates = max_pending_updates
+        self._workers = None
+        self._locks = {}
+        self._waiters = defaultdict(int)
+        self._capacity = None
+        self.pending = 0
+        self.running = 0
+        self.latency = defaultdict(LatencyStats)
+        # أسماء الأوامر المسجلة (يضبطها build_application بعد إضافة المعالجات)
+        self.commands = frozenset()
+
+    async def initialize(self):
+        self._workers = asyncio.Semaphore(self.max_workers)
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+
+    async def shutdown(self):
+        pass
+
+    # انتظار توفر مكان قبل قبول تحديث جديد (يُستخدم في webhook)
+    async def wait_for_capacity(self):
+        if self._capacity is not None:
+            await self._capacity.wait()
+
+    def _update_capacity(self):
+        if self.pending >= self.max_pending_updates:
+            self._capacity.clear()
+        else:
+            self._capacity.set()
+
+    # قفل المستخدم: يضمن ترتيب معالجة تحديثاته، ويُستخدم أيضاً لمهام المؤقتات
+    @contextlib.asynccontextmanager
+    async def user_lock(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        self.pending += 1
+        self._update_capacity()
+        try:
+            async with self.user_lock(update_key(update)):
+                async with self._workers:
+                    self.running += 1
+                    start = time.perf_counter()
+                    try:
+                        await coroutine
+                    finally:
+                        self._latency(update).observe(time.perf_counter() - start)
+                        self.running -= 1
+        finally:
+            self.pending -= 1
+            self._update_capacity()
+
+    def _latency(self, update):
+        kind = update_kind(update, self.commands)
+        if kind not in self.latency and len(self.latency) >= MAX_HANDLER_LABELS:
+            kind = "other"
+        return self.latency[kind]
+
+    def snapshot(self):
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "active_users": len(self._locks),
+            "handlers": {kind: stats.snapshot() for kind, stats in self.latency.items()},
+        }
@@ -0,0 +1,58 @@
+import heapq
+
+from database import score_bucket
+
+MIN_ATTEMPTS_FOR_DIFFICULTY = 5
+
+# إحصاءات تراكمية في الذاكرة تُحدَّث مع كل نتيجة، فلا حاجة لمسح كل السجلات عند العرض
+class StatsAggregator:
+    def __init__(self):
+        self.tests = 0
+        self.total_percentage = 0.0
+        self.histogram = [0] * 11
+        self.students = {}
+        self.questions = {}
+
+    def load(self, stats):
+        self.__init__()
+        for user_id, tests, total_percentage, best_percentage in stats["students"]:
+            self.students[user_id] = [tests, total_percentage, best_percentage]
+        for question_id, attempts, correct in stats["questions"]:
+            self.questions[question_id] = [attempts, correct]
+        for bucket, tests in stats["histogram"]:
+            self.histogram[bucket] = tests
+        self.tests = sum(self.histogram)
+        self.total_percentage = sum(s[1] for s in self.students.values())
+
+    # تسجيل اختبار منتهٍ: answers قائمة (معرّف السؤال، صحيحة أم لا)
+    def record(self, user_id, percentage, answers=()):
+        self.tests += 1
+        self.total_percentage += percentage
+        self.histogram[score_bucket(percentage)] += 1
+        student = self.students.get(str(user_id))
+        if student is None:
+            self.students[str(user_id)] = [1, percentage, percentage]
+        else:
+            student[0] += 1
+            student[1] += percentage
+            student[2] = max(student[2], percentage)
+        for question_id, correct in answers:
+            question = self.questions.setdefault(question_id, [0, 0])
+            question[0] += 1
+            question[1] += 1 if correct else 0
+
+    def mean(self):
+        return self.total_percentage / self.tests if self.tests else 0.0
+
+    def student(self, user_id):
+        student = self.students.get(str(user_id))
+        if student is None:
+            return None
+        tests, total_percentage, best_percentage = student
+        return {"tests": tests, "mean": total_percentage / tests, "best": best_percentage}
+
+    # أصعب الأسئلة (أقل نسبة إجابة صحيحة) بين ما له عدد كافٍ من المحاولات
+    def hardest(self, n=5):
+        candidates = ((correct / attempts, question_id) for question_id, (attempts, correct) in self.questions.items()
+                      if attempts >= MIN_ATTEMPTS_FOR_DIFFICULTY)
+        return heapq.nsmallest(n, candidates)
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import logging
+import os
+
+from database import DEFAULT_CLASS_ID
+from sampler import DifficultyIndex, QuestionSampler
+
+logger = logging.getLogger(__name__)
+
+QUESTION_TYPES = ("multiple_choice", "true_false")
+
+# قراءة سجل JSONL مع تجاهل السطر الأخير إذا كان مقطوعاً
+def read_journal(path):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning("تجاهل سطر تالف في %s (السطر %d)", path, line_no)
+    return entries
+
+MIGRATING_SUFFIX = ".migrating"
+
+# حجز ملف للترحيل بإعادة تسميته إلى *.migrating قبل قراءته: إعادة التسمية ذرية،
+# فإذا سبقتنا عملية أخرى إليه لا يُستورد مرتين (None إذا لم يكن الملف موجوداً).
+# ملف *.migrating متبقٍّ من تشغيل توقف قبل إكمال الترحيل يُستأنف بدل أن يبقى معلقاً
+def _claim_legacy_file(path):
+    claimed = path + MIGRATING_SUFFIX
+    if os.path.exists(claimed):
+        logger.warning("استئناف ترحيل لم يكتمل: %s", claimed)
+        return claimed
+    try:
+        os.replace(path, claimed)
+    except FileNotFoundError:
+        return None
+    return claimed
+
+# الملفات المحجوزة: تصبح *.migrated بعد نجاح الاستيراد، وتعود إلى أسمائها الأصلية إذا فشل
+# فيُعاد الترحيل في التشغيل التالي
+@contextlib.contextmanager
+def _claimed_legacy_files(*paths):
+    claimed = [_claim_legacy_file(path) for path in paths]
+    try:
+        yield claimed
+    except BaseException:
+        for path, claimed_path in zip(paths, claimed):
+            if claimed_path and not os.path.exists(path):
+                os.replace(claimed_path, path)
+        raise
+    for path, claimed_path in zip(paths, claimed):
+        if claimed_path:
+            os.replace(claimed_path, path + ".migrated")
+
+# ترحيل ملفات JSON القديمة إلى قاعدة البيانات مرة واحدة
+def migrate_legacy_files(db, questions_file, results_file, legacy_results_file):
+    with _claimed_legacy_files(questions_file, questions_file + ".log") as (questions_claimed, journal_claimed):
+        questions = []
+        if questions_claimed:
+            with open(questions_claimed, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            for q_type in QUESTION_TYPES:
+                questions.extend(snapshot.get(q_type, []))
+        if journal_claimed:
+            questions.extend(read_journal(journal_claimed))
+        if questions:
+            db.add_questions(questions)
+            logger.info("تم ترحيل %d سؤال إلى قاعدة البيانات", len(questions))
+
+    with _claimed_legacy_files(results_file, legacy_results_file) as (results_claimed, legacy_claimed):
+        records = read_journal(results_claimed) if results_claimed else []
+        if legacy_claimed:
+            with open(legacy_claimed, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            for user_id, user_results in legacy.items():
+                for test in user_results.get("tests", []):
+                    record = {"user_id": user_id, "name": user_results.get("name")}
+                    record.update(test)
+                    records.append(record)
+        if records:
+            db.add_results(records)
+            logger.info("تم ترحيل %d نتيجة إلى قاعدة البيانات", len(records))
+
+# نسخة من بنك أسئلة فصل واحد في الذاكرة فوق قاعدة البيانات: القراءة من الذاكرة والكتابة إلى القاعدة
+class QuestionStore:
+    def __init__(self, db, recent_window=20, class_id=DEFAULT_CLASS_ID):
+        self.db = db
+        self.recent_window = recent_window
+        self.class_id = class_id
+        self._synced_id = 0
+        self._by_id = {}
+        self.sampler = QuestionSampler(recent_window)
+        self.difficulty = DifficultyIndex()
+
+    async def load(self):
+        questions = await self.db.run(self.db.list_questions, self.class_id)
+        stats = await self.db.run(self.db.question_stats, self.class_id)
+        self._by_id = {}
+        self.sampler = QuestionSampler(self.recent_window)
+        self.difficulty = DifficultyIndex()
+        for question in questions:
+            self._insert(question, stats.get(question["id"], (0, 0)))
+        self._synced_id = max(self._by_id, default=0)
+        logger.info("تم تحميل %d سؤال للفصل %s", len(self._by_id), self.class_id)
+
+    def _insert(self, question, stats=(0, 0)):
+        self._by_id[question["id"]] = question
+        self.sampler.add(question)
+        self.difficulty.add(question["id"], *stats)
+
+    def get(self, question_id):
+        return self._by_id.get(question_id)
+
+    def count(self):
+        return len(self._by_id)
+
+    # اختيار k أسئلة عشوائية مع تجنب ما رآه الطالب مؤخراً
+    def sample(self, k, q_type=None, category=None, user_id=None):
+        exclude = self.sampler.recent(user_id) if user_id is not None else ()
+        question_ids = self.sampler.sample(k, q_type, category, exclude)
+        if user_id is not None:
+            self.sampler.remember(user_id, question_ids)
+        return [self._by_id[i] for i in question_ids]
+
+    # الاختيار التكيفي: سؤال قريب من مستوى الطالب ليس في اختباره الحالي (exclude)، ويُفضَّل ما لم يره مؤخراً
+    # (prior: مستوى أولي لمن لم يُجب بعد في هذه العملية)
+    def next_adaptive(self, user_id, exclude=(), prior=0.0):
+        question_id = self.difficulty.choose(user_id, set(exclude), self.sampler.recent(user_id), prior)
+        if question_id is None:
+            return None
+        self.sampler.remember(user_id, [question_id])
+        return self._by_id[question_id]
+
+    # تحديث صعوبة السؤال ومستوى الطالب بعد كل إجابة مصحَّحة
+    def record_answer(self, user_id, question_id, correct, prior=0.0):
+        self.difficulty.record(user_id, question_id, correct, prior)
+
+    # جلب الأسئلة التي أضافتها عمليات أخرى على قاعدة البيانات نفسها
+    async def refresh(self):
+        def fetch():
+            return list(self.db.iter_questions(self.class_id, after_id=self._synced_id))
+        questions = await self.db.run(fetch)
+        self.extend(q for q in questions if q["id"] not in self._by_id)
+        if questions:
+            self._synced_id = questions[-1]["id"]
+        return len(questions)
+
+    def extend(self, questions):
+        for question in questions:
+            self._insert(question)
+
+    async def add(self, question):
+        saved = await self.db.run(self.db.add_question, dict(question, class_id=self.class_id))
+        self._insert(saved)
+        return saved
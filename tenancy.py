@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from database import DEFAULT_CLASS_ID
+from stats import StatsAggregator
+from store import QuestionStore
+
+logger = logging.getLogger(__name__)
+
+ROLE_ADMIN = "admin"
+ROLE_STUDENT = "student"
+
+# الفصول والأدوار: الأدوار في الذاكرة (قاموس لكل مستخدم) وتُكتب إلى قاعدة البيانات،
+# وبنك الأسئلة والإحصاءات يُحمَّلان لكل فصل عند أول استخدام فقط
+class Tenancy:
+    def __init__(self, db, recent_window=20):
+        self.db = db
+        self.recent_window = recent_window
+        self.classes = {}
+        self._codes = {}
+        self._roles = {}
+        self._members = {}
+        self._active = {}
+        self._stores = {}
+        self._stats = {}
+
+    async def load(self, admin_ids=()):
+        await self.reload()
+        # معلمو الإعدادات (ADMIN_IDS) يديرون الفصل الافتراضي
+        for user_id in admin_ids:
+            if self.role(user_id, DEFAULT_CLASS_ID) != ROLE_ADMIN:
+                await self.join(user_id, None, DEFAULT_CLASS_ID, ROLE_ADMIN)
+        logger.info("تم تحميل %d فصل و%d مستخدم", len(self.classes), len(self._roles))
+
+    # إعادة قراءة الفصول والأدوار من قاعدة البيانات (قد تغيّرها عمليات أخرى)
+    async def reload(self):
+        classes = await self.db.run(self.db.list_classes)
+        memberships = await self.db.run(self.db.load_memberships)
+        active = await self.db.run(self.db.load_active_classes)
+        self.classes, self._codes, self._roles, self._members = {}, {}, {}, {}
+        for class_info in classes:
+            self._add_class(class_info)
+        for user_id, class_id, role in memberships:
+            self._set_role(user_id, class_id, role)
+        self._active = dict(active)
+
+    # مزامنة ما في الذاكرة مع ما كتبته العمليات الأخرى: الأدوار، الأسئلة الجديدة، والإحصاءات
+    async def refresh(self):
+        await self.reload()
+        for task in list(self._stores.values()):
+            if task.done() and not task.exception():
+                await task.result().refresh()
+        # الإحصاءات تُعاد قراءتها عند أول استخدام
+        self._stats = {class_id: task for class_id, task in self._stats.items() if not task.done()}
+
+    def _add_class(self, class_info):
+        self.classes[class_info["id"]] = class_info
+        self._codes[class_info["join_code"]] = class_info["id"]
+        self._members.setdefault(class_info["id"], {})
+
+    def _set_role(self, user_id, class_id, role):
+        self._roles.setdefault(user_id, {})[class_id] = role
+        self._members.setdefault(class_id, {})[user_id] = role
+
+    # الفصل الحالي للمستخدم (الافتراضي لمن لم ينضم لأي فصل)
+    def class_of(self, user_id):
+        return self._active.get(str(user_id), DEFAULT_CLASS_ID)
+
+    def role(self, user_id, class_id=None):
+        user_id = str(user_id)
+        if class_id is None:
+            class_id = self.class_of(user_id)
+        return self._roles.get(user_id, {}).get(class_id)
+
+    def is_admin(self, user_id, class_id=None):
+        return self.role(user_id, class_id) == ROLE_ADMIN
+
+    def is_member(self, user_id):
+        return str(user_id) in self._roles
+
+    def classes_of(self, user_id):
+        return dict(self._roles.get(str(user_id), {}))
+
+    def class_by_code(self, join_code):
+        return self._codes.get(join_code.strip().upper())
+
+    def students(self, class_id):
+        return [user_id for user_id, role in self._members.get(class_id, {}).items() if role == ROLE_STUDENT]
+
+    async def create_class(self, name):
+        class_info = await self.db.run(self.db.create_class, name)
+        self._add_class(class_info)
+        return class_info
+
+    # تسجيل المستخدم في فصل (أو تغيير دوره) وجعله فصله الحالي
+    async def join(self, user_id, name, class_id, role=ROLE_STUDENT):
+        user_id = str(user_id)
+        await self.db.run(self.db.set_membership, user_id, name, class_id, role)
+        self._set_role(user_id, class_id, role)
+        self._active[user_id] = class_id
+
+    async def switch(self, user_id, class_id):
+        user_id = str(user_id)
+        await self.db.run(self.db.set_active_class, user_id, class_id)
+        self._active[user_id] = class_id
+
+    def _store_task(self, class_id):
+        task = self._stores.get(class_id)
+        if task is None:
+            store = QuestionStore(self.db, self.recent_window, class_id)
+            task = self._stores[class_id] = asyncio.ensure_future(self._load(store, store.load()))
+        return task
+
+    # بدء تحميل بنك الفصل في الخلفية دون انتظار (store ينتظر التحميل نفسه لاحقاً)
+    def preload(self, class_id):
+        def report(task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("تعذر تحميل أسئلة الفصل %s: %s", class_id, task.exception())
+        self._store_task(class_id).add_done_callback(report)
+
+    # بنك أسئلة الفصل؛ يُحمَّل مرة واحدة حتى لو طُلب من عدة معالجات في الوقت نفسه
+    async def store(self, class_id):
+        task = self._store_task(class_id)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            self._stores.pop(class_id, None)
+            raise
+
+    async def stats(self, class_id):
+        task = self._stats.get(class_id)
+        if task is None:
+            stats = StatsAggregator()
+            task = self._stats[class_id] = asyncio.ensure_future(self._load(stats, self._load_stats(stats, class_id)))
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            self._stats.pop(class_id, None)
+            raise
+
+    async def _load_stats(self, stats, class_id):
+        stats.load(await self.db.run(self.db.load_stats, class_id))
+
+    async def _load(self, value, loading):
+        await loading
+        return value
@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import bulk
+from bulk import import_questions, validate_row
+from database import Database
+
+
+def jsonl(*rows):
+    return io.StringIO("\n".join(row if isinstance(row, str) else json.dumps(row, ensure_ascii=False) for row in rows))
+
+
+def multiple_choice(text, **extra):
+    row = {"type": "multiple_choice", "question": text, "options": ["أ", "ب", "ج"], "correct_option": 1}
+    row.update(extra)
+    return row
+
+
+class ValidateRowTest(unittest.TestCase):
+    def test_csv_multiple_choice(self):
+        question = validate_row({"type": "multiple_choice", "question": " ما الناتج؟ ", "options": "1| 2 |3",
+                                 "correct": "2", "category": "حساب", "photo_id": ""})
+        self.assertEqual(question, {"type": "multiple_choice", "question": "ما الناتج؟", "options": ["1", "2", "3"],
+                                    "correct_option": 1, "category": "حساب"})
+
+    def test_true_false(self):
+        self.assertTrue(validate_row({"type": "true_false", "question": "س", "correct": "صح"})["correct_answer"])
+        self.assertFalse(validate_row({"type": "true_false", "question": "س", "correct_answer": False})["correct_answer"])
+
+    def test_malformed_rows_raise_value_error(self):
+        rows = [
+            None,
+            [],
+            {"type": 5, "question": "س", "correct": "صح"},
+            {"type": "true_false", "question": 7, "correct": "صح"},
+            {"type": "true_false", "question": ["س"], "correct": "صح"},
+            {"type": "essay", "question": "س"},
+            {"type": "true_false", "question": "  ", "correct": "صح"},
+            {"type": "true_false", "question": "س", "correct": "ربما"},
+            {"type": "true_false", "question": "س", "correct": "صح", "category": 3},
+            multiple_choice("س", options=5),
+            multiple_choice("س", options={"a": 1}),
+            multiple_choice("س", options=["أ", 2]),
+            multiple_choice("س", options=["أ"]),
+            multiple_choice("س", correct_option=3),
+            multiple_choice("س", correct_option=[0]),
+        ]
+        for row in rows:
+            with self.subTest(row=row), self.assertRaises(ValueError):
+                validate_row(row)
+
+
+class ImportQuestionsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp.name, "bulk.db"))
+        self.db.init()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_malformed_rows_are_reported_per_line(self):
+        f = jsonl(multiple_choice("الأول"), {"type": 5, "question": "س"}, "{not json", {"question": 7},
+                  multiple_choice("الثاني"))
+        report = import_questions(self.db, f, "jsonl")
+        self.assertEqual((report.rows, report.imported, report.error_count), (5, 2, 3))
+        self.assertEqual([line_no for line_no, _ in report.errors], [2, 3, 4])
+        self.assertEqual(self.db.count_questions(), 2)
+
+    def test_duplicates_in_file_and_in_database_are_skipped(self):
+        import_questions(self.db, jsonl(multiple_choice("موجود")), "jsonl")
+        f = jsonl(multiple_choice("جديد"), multiple_choice("  جديد "), multiple_choice("موجود"),
+                  multiple_choice("جديد", options=["س", "ص"]))
+        report = import_questions(self.db, f, "jsonl")
+        self.assertEqual((report.imported, report.duplicates), (2, 2))
+        self.assertEqual(self.db.count_questions(), 3)
+
+    def test_rows_are_inserted_in_batches(self):
+        batches = []
+        with mock.patch.object(bulk, "BATCH_SIZE", 3):
+            report = import_questions(self.db, jsonl(*(multiple_choice(f"س {i}") for i in range(7))), "jsonl",
+                                      on_batch=lambda saved: batches.append(len(saved)))
+        self.assertEqual(batches, [3, 3, 1])
+        self.assertEqual(report.imported, 7)
+
+    def test_exact_multiple_of_batch_size_has_no_empty_batch(self):
+        batches = []
+        progress = []
+        with mock.patch.object(bulk, "BATCH_SIZE", 3):
+            import_questions(self.db, jsonl(*(multiple_choice(f"س {i}") for i in range(6))), "jsonl",
+                             progress=lambda report: progress.append(report.imported),
+                             on_batch=lambda saved: batches.append(len(saved)))
+        self.assertEqual(batches, [3, 3])
+        # بلا دفعة أخيرة يُرسل تقدم نهائي بالأعداد الكاملة
+        self.assertEqual(progress, [3, 6, 6])
+
+    def test_csv_import(self):
+        f = io.StringIO("type,question,options,correct,category,photo_id,image\n"
+                        "multiple_choice,س1,أ|ب,2,,,\n"
+                        "true_false,س2,,خطأ,علوم,,\n"
+                        "true_false,,,صح,,,\n")
+        report = import_questions(self.db, f, "csv")
+        self.assertEqual((report.imported, report.error_count), (2, 1))
+        self.assertEqual(report.errors[0][0], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
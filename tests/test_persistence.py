@@ -0,0 +1,72 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from database import Database
+from persistence import SQLitePersistence
+
+
+class SQLitePersistenceTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "bot.db")
+        self.db = Database(self.path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    # قراءة الجلسات المحفوظة بعد انتهاء كل الكتابات الجارية
+    async def reload(self):
+        await asyncio.to_thread(self.db.close)
+        db = Database(self.path)
+        try:
+            return await SQLitePersistence(db).get_user_data()
+        finally:
+            await asyncio.to_thread(db.close)
+
+    async def test_round_trip(self):
+        persistence = SQLitePersistence(self.db)
+        self.assertEqual(await persistence.get_user_data(), {})
+        await persistence.update_user_data(1, {"test_question_ids": [3, 1], "answers": [0], "name": "طالب"})
+        await persistence.update_user_data(2, {"score": 1})
+        await persistence.flush()
+        self.assertEqual(await self.reload(), {1: {"test_question_ids": [3, 1], "answers": [0], "name": "طالب"},
+                                               2: {"score": 1}})
+        await persistence.drop_user_data(2)
+        await persistence.flush()
+        self.assertEqual(list(await self.reload()), [1])
+
+    async def test_expired_sessions_are_not_restored(self):
+        self.db.init()
+        self.db.save_sessions({1: '{"score": 1}'}, time.time() - 100)
+        self.db.save_sessions({2: '{"score": 2}'}, time.time())
+        self.assertEqual(await SQLitePersistence(self.db, session_ttl=50).get_user_data(), {2: {"score": 2}})
+
+    # كتابة بطيئة لنسخة قديمة يجب ألا تطغى على نسخة أحدث للمستخدم نفسه
+    async def test_later_snapshot_wins_when_an_earlier_write_is_slow(self):
+        persistence = SQLitePersistence(self.db)
+        await persistence.get_user_data()
+        save_sessions = self.db.save_sessions
+        first = threading.Event()
+
+        def slow_first_save(sessions, now):
+            if not first.is_set():
+                first.set()
+                time.sleep(0.2)
+            save_sessions(sessions, now)
+
+        self.db.save_sessions = slow_first_save
+        await persistence.update_user_data(1, {"current_question": 1})
+        while not first.is_set():
+            await asyncio.sleep(0.001)
+        await persistence.update_user_data(1, {"current_question": 2})
+        await persistence.flush()
+        self.assertEqual(await self.reload(), {1: {"current_question": 2}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import random
+import unittest
+
+from sampler import DifficultyIndex
+
+
+class DifficultyIndexTest(unittest.TestCase):
+    # بنك صغير والأسئلة الجديدة كلها في دلو واحد: لا يتكرر سؤال داخل الاختبار نفسه
+    def test_choose_never_repeats_a_question_of_the_current_test(self):
+        rng = random.Random(1)
+        index = DifficultyIndex(rng=rng)
+        for question_id in range(12):
+            index.add(question_id)
+        recent = set()
+        for _ in range(160):
+            test = []
+            for _ in range(10):
+                question_id = index.choose("7", exclude=set(test), avoid=recent)
+                self.assertNotIn(question_id, test)
+                test.append(question_id)
+                index.record("7", question_id, rng.random() < 0.5)
+            recent = set(test)
+
+    def test_recently_seen_questions_are_avoided_when_possible(self):
+        index = DifficultyIndex(rng=random.Random(2))
+        for question_id in range(12):
+            index.add(question_id)
+        for _ in range(50):
+            self.assertEqual(index.choose("7", avoid=set(range(11))), 11)
+
+    def test_choose_returns_none_when_every_question_is_excluded(self):
+        index = DifficultyIndex()
+        for question_id in range(3):
+            index.add(question_id)
+        self.assertIsNone(index.choose("7", exclude={0, 1, 2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from telegram import Update
+
+from bench.harness import StubRequest, callback_update, message_update
+from scheduler import MAX_HANDLER_LABELS, PerUserUpdateProcessor, update_kind
+
+
+def message(text, user_id=1, update_id=1):
+    return Update.de_json(message_update(update_id, user_id, text), None)
+
+
+def callback(data, user_id=1, update_id=1):
+    return Update.de_json(callback_update(update_id, user_id, data, 1), None)
+
+
+async def noop():
+    pass
+
+
+class UpdateKindTest(unittest.TestCase):
+    def test_callback_labels_drop_parameters(self):
+        self.assertEqual(update_kind(callback("answer_3")), "answer")
+        self.assertEqual(update_kind(callback("view_results:2")), "view_results")
+        self.assertEqual(update_kind(callback("live_answer:7:3:2:1")), "live_answer")
+
+    def test_only_registered_commands_get_their_own_label(self):
+        commands = frozenset({"start", "stats"})
+        self.assertEqual(update_kind(message("/start"), commands), "start")
+        self.assertEqual(update_kind(message("/Stats@quiz_bot now"), commands), "stats")
+        self.assertEqual(update_kind(message("/random123"), commands), "command_other")
+        self.assertEqual(update_kind(message("مرحبا"), commands), "message")
+
+
+class ProcessorLabelsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.processor = PerUserUpdateProcessor(4, 100)
+        self.processor.commands = frozenset({"start"})
+        await self.processor.initialize()
+
+    async def test_unknown_commands_do_not_grow_labels(self):
+        for i in range(500):
+            await self.processor.do_process_update(message(f"/cmd{i}", user_id=i, update_id=i), noop())
+        await self.processor.do_process_update(message("/start"), noop())
+        self.assertEqual(set(self.processor.latency), {"command_other", "start"})
+        self.assertEqual(self.processor.latency["command_other"].count, 500)
+
+    async def test_label_count_is_capped(self):
+        for i in range(MAX_HANDLER_LABELS * 3):
+            await self.processor.do_process_update(callback(f"forged{i}", update_id=i), noop())
+        self.assertEqual(len(self.processor.latency), MAX_HANDLER_LABELS + 1)
+        self.assertIn("other", self.processor.latency)
+
+
+class RegisteredCommandsTest(unittest.TestCase):
+    def test_build_application_registers_command_names(self):
+        from main import build_application
+        with tempfile.TemporaryDirectory() as tmp:
+            application = build_application("1:stub", "1", database_file=os.path.join(tmp, "bot.db"), base_url="",
+                                            request=StubRequest())
+            self.assertTrue({"start", "stats", "export", "join"} <= application.update_processor.commands)
+            application.bot_data["db"].close()
+
+
+if __name__ == '__main__':
+    unittest.main()
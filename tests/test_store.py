@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from database import Database
+from store import migrate_legacy_files
+
+
+def legacy_question(text):
+    return {"type": "true_false", "question": text, "correct_answer": True}
+
+
+class MigrateLegacyFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp.name, "bot.db"))
+        self.db.init()
+        self.questions_file = self.path("questions.json")
+        with open(self.questions_file, "w", encoding="utf-8") as f:
+            json.dump({"multiple_choice": [], "true_false": [legacy_question("س1"), legacy_question("س2")]}, f)
+        with open(self.path("results.json"), "w", encoding="utf-8") as f:
+            json.dump({"5": {"name": "طالب", "tests": [{"date": "2024-01-01 10:00", "score": 1, "total": 2,
+                                                       "percentage": 50}]}}, f)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def migrate(self):
+        migrate_legacy_files(self.db, self.questions_file, self.path("results.jsonl"), self.path("results.json"))
+
+    def test_migrates_once_and_marks_files(self):
+        self.migrate()
+        self.migrate()
+        self.assertEqual(self.db.count_questions(), 2)
+        self.assertEqual(len(self.db.read("SELECT * FROM results")), 1)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         ["bot.db", "bot.db-shm", "bot.db-wal", "questions.json.migrated", "results.json.migrated"])
+
+    # فشل بعد حجز الملف (قاعدة مقفلة مثلاً): يعود الملف إلى اسمه ويُرحَّل في التشغيل التالي
+    def test_failure_after_claim_restores_the_file(self):
+        with mock.patch.object(self.db, "add_questions", side_effect=sqlite3.OperationalError("database is locked")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.migrate()
+        self.assertTrue(os.path.exists(self.questions_file))
+        self.assertFalse(os.path.exists(self.questions_file + ".migrating"))
+        self.migrate()
+        self.assertEqual(self.db.count_questions(), 2)
+
+    def test_corrupt_file_is_left_for_the_next_run(self):
+        with open(self.questions_file, "w", encoding="utf-8") as f:
+            f.write("{")
+        with self.assertRaises(ValueError):
+            self.migrate()
+        self.assertTrue(os.path.exists(self.questions_file))
+
+    # توقف العملية بين الحجز والاستيراد يترك *.migrating: يُستأنف ولا يبقى معلقاً
+    def test_leftover_migrating_file_is_resumed(self):
+        os.replace(self.questions_file, self.questions_file + ".migrating")
+        self.migrate()
+        self.assertEqual(self.db.count_questions(), 2)
+        self.assertTrue(os.path.exists(self.questions_file + ".migrated"))
+        self.assertFalse(os.path.exists(self.questions_file + ".migrating"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from timers import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_due_entries_fire_in_order_of_ticks(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.advance(100.0)
+        wheel.schedule("a", 102.5, 1)
+        wheel.schedule("b", 104.0, 2)
+        self.assertEqual(wheel.advance(101.0), [])
+        self.assertEqual(wheel.advance(102.9), [("a", 1)])
+        self.assertEqual(wheel.advance(110.0), [("b", 2)])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.advance(0.0)
+        wheel.schedule("a", 3.0, 1)
+        wheel.schedule("a", 5.0, 2)
+        wheel.schedule("b", 3.0)
+        wheel.cancel("b")
+        self.assertEqual(wheel.advance(4.0), [])
+        self.assertEqual(wheel.advance(5.0), [("a", 2)])
+
+    # مواعيد مسترجعة بعد إعادة التشغيل وقد فاتت: تُنفَّذ في أول نبضة لا بعد دورة كاملة للعجلة
+    def test_overdue_entry_scheduled_before_first_advance_fires_on_first_tick(self):
+        wheel = TimerWheel(tick=1.0, slots=512)
+        wheel.schedule(("1", "test"), 1000.0, "started")
+        wheel.schedule(("2", "test"), 1200.0, "later")
+        self.assertEqual(wheel.advance(1100.0), [(("1", "test"), "started")])
+        self.assertEqual(len(wheel), 1)
+
+    def test_entry_far_in_the_past_fires_on_first_tick(self):
+        wheel = TimerWheel(tick=0.2, slots=16)
+        wheel.schedule("a", 10.0)
+        self.assertEqual(wheel.advance(500.0), [("a", None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import asyncio
+import unittest
+
+from webhook import is_loopback, run_webhook
+
+
+class WebhookHostTest(unittest.TestCase):
+    def test_is_loopback(self):
+        for host in ("127.0.0.1", "127.0.0.2", "::1", "localhost"):
+            self.assertTrue(is_loopback(host), host)
+        for host in ("0.0.0.0", "::", "10.0.0.5", "example.com", ""):
+            self.assertFalse(is_loopback(host), host)
+
+    # خادم بلا رمز سري على واجهة عامة يقبل تحديثات مزيفة من أي أحد
+    def test_refuses_public_host_without_secret(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(run_webhook(None, "0.0.0.0", 8080, "/telegram"))
+
+
+if __name__ == '__main__':
+    unittest.main()
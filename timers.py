@@ -0,0 +1,52 @@
+# عجلة مؤقتات (hashed timing wheel): جدولة وإلغاء في O(1)، وكل نبضة تفحص خانة واحدة فقط.
+# تُدار كل مواعيد الاختبارات بمهمة واحدة مكررة بدلاً من مهمة لكل طالب لكل سؤال.
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]
+        self._where = {}
+        self._current = None
+
+    def __len__(self):
+        return len(self._where)
+
+    def _tick_of(self, deadline):
+        tick_no = int(deadline // self.tick)
+        if self._current is not None and tick_no <= self._current:
+            tick_no = self._current + 1
+        return tick_no
+
+    # جدولة موعد جديد للمفتاح (يحل محل الموعد السابق إن وجد)
+    def schedule(self, key, deadline, payload=None):
+        self.cancel(key)
+        tick_no = self._tick_of(deadline)
+        slot = tick_no % len(self._slots)
+        self._slots[slot][key] = (tick_no, payload)
+        self._where[key] = slot
+
+    def cancel(self, key):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    # التقدم حتى الوقت now وإرجاع المواعيد المستحقة [(key, payload)]
+    def advance(self, now):
+        target = int(now // self.tick)
+        if self._current is None:
+            # أول نبضة تفحص كل الخانات: المواعيد المجدولة قبلها (مثل المسترجعة بعد إعادة التشغيل) قد تكون فاتت
+            self._current = target - len(self._slots)
+        if target <= self._current:
+            return []
+        # بعد توقف طويل يكفي المرور على كل الخانات مرة واحدة
+        start = max(self._current + 1, target - len(self._slots) + 1)
+        due = []
+        for tick_no in range(start, target + 1):
+            slot = self._slots[tick_no % len(self._slots)]
+            if not slot:
+                continue
+            expired = [key for key, (entry_tick, _) in slot.items() if entry_tick <= target]
+            for key in expired:
+                due.append((key, slot.pop(key)[1]))
+                del self._where[key]
+        self._current = target
+        return due
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+QUESTIONS_PAGE_SIZE = 20
+RESULTS_PAGE_SIZE = 30
+TYPE_LABELS = {"multiple_choice": "اختيار من متعدد", "true_false": "صح/خطأ"}
+
+# ذاكرة مؤقتة للصفحات المعروضة، تُفرَّغ عند إضافة سؤال أو نتيجة.
+# المفتاح view هو (اسم العرض، رقم الفصل)
+class PageCache:
+    def __init__(self, max_pages=256):
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._versions = {}
+        self._epoch = 0
+
+    def version(self, view):
+        return (self._epoch, self._versions.get(view, 0))
+
+    def get(self, view, page):
+        key = (view, page)
+        if key not in self._pages:
+            return None
+        self._pages.move_to_end(key)
+        return self._pages[key]
+
+    def put(self, view, page, rendered, version):
+        # تجاهل صفحة رُسمت قبل آخر إبطال
+        if version != self.version(view):
+            return
+        self._pages[(view, page)] = rendered
+        self._pages.move_to_end((view, page))
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def invalidate(self, view):
+        self._versions[view] = self._versions.get(view, 0) + 1
+        for key in [k for k in self._pages if k[0] == view]:
+            del self._pages[key]
+
+    # إبطال كل الصفحات (عند تغير البيانات من عملية أخرى)
+    def clear(self):
+        self._epoch += 1
+        self._pages.clear()
+
+# رقم الصفحة من بيانات الزر (view_questions أو view_questions:3)
+def parse_page(data):
+    _, _, page = data.partition(":")
+    return int(page) if page.isdigit() else 0
+
+def nav_keyboard(view, page, pages):
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("◀️ السابق", callback_data=f"{view}:{page - 1}"))
+    if page + 1 < pages:
+        row.append(InlineKeyboardButton("التالي ▶️", callback_data=f"{view}:{page + 1}"))
+    keyboard = [row] if row else []
+    keyboard.append([InlineKeyboardButton("رجوع", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(keyboard)
+
+def page_count(total, page_size):
+    return max(1, (total + page_size - 1) // page_size)
+
+def render_questions_page(db, class_id, page):
+    total = db.count_questions(class_id)
+    if total == 0:
+        return "لا توجد أسئلة بعد.", None
+    pages = page_count(total, QUESTIONS_PAGE_SIZE)
+    page = min(page, pages - 1)
+    offset = page * QUESTIONS_PAGE_SIZE
+    lines = [f"📋 قائمة الأسئلة ({page + 1}/{pages}):\n"]
+    for i, q in enumerate(db.questions_page(class_id, offset, QUESTIONS_PAGE_SIZE), offset + 1):
+        lines.append(f"{i}. {'🖼️' if q.get('photo_id') else '❓'} {q['question']} ({TYPE_LABELS.get(q['type'], q['type'])})")
+    return "\n".join(lines)[:4000], nav_keyboard("view_questions", page, pages)
+
+def render_results_page(db, class_id, page):
+    total = db.count_results(class_id)
+    if total == 0:
+        return "لا توجد نتائج بعد.", None
+    pages = page_count(total, RESULTS_PAGE_SIZE)
+    page = min(page, pages - 1)
+    lines = [f"📊 النتائج ({page + 1}/{pages}):\n"]
+    current_user = None
+    for result in db.results_page(class_id, page * RESULTS_PAGE_SIZE, RESULTS_PAGE_SIZE):
+        if result["user_id"] != current_user:
+            current_user = result["user_id"]
+            if len(lines) > 1:
+                lines.append("")
+            lines.append(f"👤 {result['name'] or 'مجهول'}:")
+        lines.append(f"   - {result['date']}: {result['score']}/{result['total']} ({result['percentage']:.1f}%)")
+    return "\n".join(lines)[:4000], nav_keyboard("view_results", page, pages)
+
+RENDERERS = {
+    "view_questions": render_questions_page,
+    "view_results": render_results_page,
+}
+
+# جلب صفحة من الذاكرة المؤقتة أو رسمها من قاعدة البيانات
+async def get_page(context, view, page, class_id):
+    cache = context.bot_data["page_cache"]
+    rendered = cache.get((view, class_id), page)
+    if rendered is None:
+        version = cache.version((view, class_id))
+        db = context.bot_data["db"]
+        rendered = await db.run(RENDERERS[view], db, class_id, page)
+        cache.put((view, class_id), page, rendered, version)
+    return rendered
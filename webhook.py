@@ -0,0 +1,123 @@
+import asyncio
+import hmac
+import ipaddress
+import logging
+import secrets
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+from metrics import render_prometheus
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# هل يستمع الخادم على واجهة محلية فقط (لا يصلها أحد من خارج الجهاز)
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# خادم HTTP يستقبل التحديثات ويضعها في طابور التطبيق
+def create_web_app(application, path, secret_token):
+    async def handle_update(request):
+        if secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret_token):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # JSON صالح لكنه ليس تحديثاً (مثل {"foo": 1} أو []) يُرفض دون أثر في السجل
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        try:
+            update = Update.de_json(data, application.bot)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+        # الضغط العكسي: لا نقبل تحديثاً جديداً حتى يتوفر مكان في المعالج
+        wait_for_capacity = getattr(application.update_processor, "wait_for_capacity", None)
+        if wait_for_capacity is not None:
+            await wait_for_capacity()
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request):
+        status = {
+            "status": "ok" if application.running else "stopping",
+            "pending_updates": application.update_queue.qsize(),
+        }
+        snapshot = getattr(application.update_processor, "snapshot", None)
+        if snapshot is not None:
+            status["processor"] = snapshot()
+        return web.json_response(status)
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics_handler(application))
+    return app
+
+# مقاييس Prometheus (تُحسب عند الطلب من عدّادات في الذاكرة)
+def metrics_handler(application):
+    async def metrics(request):
+        return web.Response(text=render_prometheus(application), content_type="text/plain")
+    return metrics
+
+# خادم مقاييس مستقل لوضع polling (في وضع webhook تُعرض على خادم webhook نفسه)
+async def start_metrics_server(application, host, port):
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler(application))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("المقاييس على %s:%d/metrics", host, port)
+    return runner
+
+async def _wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    await stop.wait()
+
+# تشغيل البوت بوضع webhook حتى وصول إشارة الإيقاف
+# دون رمز سري يستطيع أي من يصل إلى المنفذ إرسال تحديثات مزيفة، فلا يُسمح بذلك إلا على واجهة محلية
+async def run_webhook(application, host, port, path, url="", secret_token=""):
+    if url and not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+    if not secret_token and not is_loopback(host):
+        raise ValueError(f"يجب تعيين WEBHOOK_SECRET للاستماع على {host}")
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        if url:
+            await application.bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES)
+        else:
+            logger.info("لم يتم تعيين WEBHOOK_URL: الخادم يعمل محلياً دون تسجيل webhook")
+        await application.start()
+
+        runner = web.AppRunner(create_web_app(application, path, secret_token))
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info("خادم webhook يستمع على %s:%d%s", host, port, path)
+
+        try:
+            await _wait_for_stop_signal()
+        finally:
+            # إيقاف استقبال الطلبات أولاً ثم إنهاء معالجة ما في الطابور
+            await runner.cleanup()
+            await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)